@@ -1,8 +1,11 @@
 import os
-import uuid
-import speech_recognition as sr
+import json
+import string
+import asyncio
+import functools
 from pydub import AudioSegment
 import imageio_ffmpeg
+import stt
 
 # Configure pydub to use bundled FFmpeg for transcoding if needed
 ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
@@ -16,123 +19,264 @@ MOODS = {
     "energetic": ["fast", "run", "jump", "power", "loud", "intense", "active", "go", "dynamic", "vibrant", "strong", "fast-paced", "vivid", "lively", "spirited", "bold", "mighty", "forceful", "electric", "wild", "hyper", "fiery", "vigorous", "strenuous", "animated", "brisk", "explosive"]
 }
 
-def _load_audio_workaround(filepath):
+NEGATIONS = {"not", "no", "never", "dont", "cannot", "isnt", "arent", "wasnt", "werent"}
+NEUTRAL_RESULT = {"neutral": 100.0, "happy": 0.0, "sad": 0.0, "angry": 0.0, "calm": 0.0, "energetic": 0.0}
+
+# Bulk scoring: lines received are scored off the event loop in batches of up to this many
+BULK_BATCH_SIZE = int(os.getenv("BULK_MOOD_BATCH_SIZE", "1000"))
+# Longer input lines are reported as errors instead of being buffered
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MOOD_MAX_LINE_BYTES", str(1024 * 1024)))
+BULK_FORMATS = ("auto", "ndjson", "text")
+
+# ============= Compiled lexicon =============
+# A word's mood is decided by the first (mood, keyword) pair in MOODS order that matches it,
+# either exactly or, for keywords longer than 4 letters, as a substring of a word that doesn't
+# start with "un"/"in" (so 'unhappy' doesn't count as 'happy'). Every pair gets an ordinal in
+# that order and a word takes the matching pair with the lowest ordinal.
+
+_MOOD_NAMES = list(MOODS.keys())
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+
+def _compile_lexicon():
+    exact = {}  # keyword -> lowest ordinal
+    substrings = {}  # keyword (len > 4) -> lowest ordinal
+    ordinal_moods = []
+    for mood_index, mood in enumerate(_MOOD_NAMES):
+        for keyword in MOODS[mood]:
+            ordinal = len(ordinal_moods)
+            ordinal_moods.append(mood_index)
+            exact.setdefault(keyword, ordinal)
+            if len(keyword) > 4:
+                substrings.setdefault(keyword, ordinal)
+    return exact, substrings, ordinal_moods
+
+
+def _build_automaton(patterns: dict):
     """
-    Workaround for missing ffprobe: Convert any format to WAV using ffmpeg 
-    and load the WAV using pydub.
+    Aho-Corasick automaton over patterns (string -> ordinal). Returns (goto, best):
+    goto[state] maps a character to the next state, best[state] is the lowest ordinal
+    of any pattern ending at that state, following failure links (None if none).
     """
-    if not os.path.exists(filepath):
-        return None
-        
-    try:
-        # If it's already a wav, load it
-        if filepath.lower().endswith('.wav'):
-            return AudioSegment.from_wav(filepath)
-            
-        # Convert to wav
-        temp_wav = f"{filepath}_temp_{uuid.uuid4().hex[:4]}.wav"
-        ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
-        import subprocess
-        subprocess.run([ffmpeg_exe, '-i', filepath, '-y', temp_wav], stderr=subprocess.PIPE, check=True)
-        
-        audio = AudioSegment.from_wav(temp_wav)
-        
-        # Cleanup
-        if os.path.exists(temp_wav):
-            os.remove(temp_wav)
-            
-        return audio
-    except Exception as e:
-        print(f"Analysis audio load workaround failed: {e}")
-        return None
+    goto, fail, best = [{}], [0], [None]
+    for pattern, ordinal in patterns.items():
+        state = 0
+        for char in pattern:
+            if char not in goto[state]:
+                goto.append({})
+                fail.append(0)
+                best.append(None)
+                goto[state][char] = len(goto) - 1
+            state = goto[state][char]
+        best[state] = ordinal if best[state] is None else min(best[state], ordinal)
 
-def analyze_text_mood(text: str):
-    import string
-    # Remove punctuation and lowercase
-    text = text.translate(str.maketrans('', '', string.punctuation)).lower()
-    words = text.split()
-    
-    if not words:
-        return {"neutral": 100.0, "happy": 0.0, "sad": 0.0, "angry": 0.0, "calm": 0.0, "energetic": 0.0}
-    
-    negations = {"not", "no", "never", "dont", "cannot", "isnt", "arent", "wasnt", "werent"}
-    scores = {mood: 0 for mood in MOODS.keys()}
-    found_any = False
-    
+    # Breadth-first: fill failure links and fold the failure chain's outputs into best
+    queue = list(goto[0].values())
+    for state in queue:
+        for char, child in goto[state].items():
+            queue.append(child)
+            link = fail[state]
+            while link and char not in goto[link]:
+                link = fail[link]
+            fail[child] = goto[link].get(char, 0)
+            inherited = best[fail[child]]
+            if inherited is not None and (best[child] is None or inherited < best[child]):
+                best[child] = inherited
+
+    # Resolve every transition up front so scanning is one dict lookup per character
+    for state in queue:
+        for char, target in goto[fail[state]].items():
+            goto[state].setdefault(char, target)
+    return goto, best
+
+
+_EXACT, _SUBSTRINGS, _ORDINAL_MOODS = _compile_lexicon()
+_GOTO, _BEST = _build_automaton(_SUBSTRINGS)
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_mood(word: str):
+    """Index into _MOOD_NAMES of the mood a word counts towards, or None."""
+    ordinal = _EXACT.get(word)
+    if not word.startswith("un") and not word.startswith("in"):
+        goto, best, root, state = _GOTO, _BEST, _GOTO[0], 0
+        for char in word:
+            state = goto[state].get(char) or root.get(char, 0)
+            found = best[state]
+            if found is not None and (ordinal is None or found < ordinal):
+                ordinal = found
+    return None if ordinal is None else _ORDINAL_MOODS[ordinal]
+
+
+def _mood_counts(words) -> list:
+    """One pass over the words; a negation word suppresses the next word's mood."""
+    counts = [0] * len(_MOOD_NAMES)
     negated = False
-    for i, word in enumerate(words):
-        # Look ahead for negation
-        if word in negations:
+    for word in words:
+        if word in NEGATIONS:
             negated = True
             continue
-            
-        match_found = False
-        for mood, keywords in MOODS.items():
-            for k in keywords:
-                # Direct match
-                if k == word:
-                    match_found = True
-                    # If negated, we might want to flip or at least ignore. 
-                    # Simple approach: if negated, don't add to this mood.
-                    if not negated:
-                        scores[mood] += 1
-                        found_any = True
-                    else:
-                        # If negated happy -> maybe sad? For now, just skip to avoid false positive
-                        # Or we could have a "opposite" map. 
-                        pass
-                    break
-                # Only allow partial match if it's significant (avoid 'unhappy' matching 'happy')
-                # Actually, 'unhappy' should be 'sad'. 
-                # Let's check for specific sub-words carefully.
-                if len(k) > 4 and k in word and not word.startswith("un") and not word.startswith("in"):
-                    match_found = True
-                    if not negated:
-                        scores[mood] += 1
-                        found_any = True
-                    break
-            if match_found: break
-            
-        # Reset negation after one word
-        if not word in negations:
-            negated = False
-            
-    if not found_any:
-        return {"neutral": 100.0, "happy": 0.0, "sad": 0.0, "angry": 0.0, "calm": 0.0, "energetic": 0.0}
-        
-    total = sum(scores.values())
-    percentages = {mood: round((count / total) * 100, 1) for mood, count in scores.items()}
+        if not negated:
+            mood_index = _word_mood(word)
+            if mood_index is not None:
+                counts[mood_index] += 1
+        negated = False
+    return counts
+
+
+def analyze_text_mood(text: str):
+    # Remove punctuation and lowercase
+    words = text.translate(_PUNCTUATION_TABLE).lower().split()
+    counts = _mood_counts(words)
+
+    return _percentages(counts)
+
+
+def _percentages(counts) -> dict:
+    total = sum(counts)
+    if not total:
+        return dict(NEUTRAL_RESULT)
+
+    percentages = {mood: round((count / total) * 100, 1) for mood, count in zip(_MOOD_NAMES, counts)}
     percentages["neutral"] = 0.0
     return percentages
 
-async def analyze_audio_mood(audio_path: str):
+async def analyze_audio_mood(audio_source):
     """
-    Transcribe audio then analyze mood from text.
+    Transcribe audio (a file path or an open upload) then analyze mood from text.
     """
-    # Simplified: convert to wav and use speech_recognition
-    # We can reuse logic from translate_service if needed
-    recognizer = sr.Recognizer()
-    
-    # Use workaround to load audio safely
-    audio = _load_audio_workaround(audio_path)
+    # Decode once, straight to 16 kHz mono PCM in memory (off the event loop)
+    audio = await asyncio.to_thread(stt.decode_speech, audio_source)
     if not audio:
         return {"status": "error", "error": "Could not decode audio file. Please ensure it is a valid audio format."}
 
-    wav_path = audio_path.rsplit('.', 1)[0] + f"_mood_{uuid.uuid4().hex[:4]}.wav"
-    audio.export(wav_path, format="wav")
-    
     try:
-        with sr.AudioFile(wav_path) as source:
-            audio_data = recognizer.record(source)
-            text = recognizer.recognize_google(audio_data)
-            mood_result = analyze_text_mood(text)
-            return {
-                "status": "success",
-                "transcribed_text": text,
-                "mood": mood_result
-            }
+        # Silence-segmented recognition, segments transcribed concurrently
+        text = await stt.transcribe(audio)
+        mood_result = analyze_text_mood(text)
+        return {
+            "status": "success",
+            "transcribed_text": text,
+            "mood": mood_result
+        }
     except Exception as e:
         return {"status": "error", "error": f"Could not analyze mood: {str(e)}"}
-    finally:
-        if os.path.exists(wav_path):
-            os.remove(wav_path)
+
+
+# ============= Bulk scoring =============
+
+def _parse_line(line, fmt: str):
+    """(id, text) of one input line. NDJSON items are strings or objects with "text" (and optional "id")."""
+    if line is None:
+        raise ValueError(f"Line is longer than {BULK_MAX_LINE_BYTES} bytes")
+    line = line.decode("utf-8", errors="replace").rstrip("\r")
+    if fmt == "text" or (fmt == "auto" and not line.lstrip().startswith(("{", '"'))):
+        return None, line
+    try:
+        item = json.loads(line)
+    except ValueError:
+        raise ValueError("Invalid JSON")
+    if isinstance(item, str):
+        return None, item
+    if isinstance(item, dict) and isinstance(item.get("text"), str):
+        return item.get("id"), item["text"]
+    raise ValueError('Expected a string or an object with a "text" field')
+
+
+def _score_batch(lines: list, first_index: int, fmt: str, totals: dict) -> list:
+    """Score a batch of raw lines, folding the counts into the running totals."""
+    results = []
+    for index, line in enumerate(lines, first_index):
+        try:
+            item_id, text = _parse_line(line, fmt)
+        except ValueError as e:
+            totals["errors"] += 1
+            results.append({"index": index, "error": str(e)})
+            continue
+
+        counts = _mood_counts(text.translate(_PUNCTUATION_TABLE).lower().split())
+        mood = _percentages(counts)
+        dominant = max(_MOOD_NAMES, key=lambda name: mood[name]) if any(counts) else "neutral"
+
+        totals["count"] += 1
+        totals["dominant"][dominant] += 1
+        for name in NEUTRAL_RESULT:
+            totals["mood_sum"][name] += mood[name]
+        for mood_index, count in enumerate(counts):
+            totals["keywords"][mood_index] += count
+
+        result = {"index": index, "mood": mood, "dominant": dominant}
+        if item_id is not None:
+            result["id"] = item_id
+        results.append(result)
+    return results
+
+
+async def _split_lines(chunks):
+    """
+    Complete lines (bytes, without the newline) of a byte stream, as one list per chunk
+    received. An overlong line is reported as None.
+    """
+    buffer = b""
+    overflow = False
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        lines = [None if len(line) > BULK_MAX_LINE_BYTES else line for line in lines]
+        if overflow and lines:
+            lines[0], overflow = None, False
+        if len(buffer) > BULK_MAX_LINE_BYTES:
+            # Drop the rest of this line as it arrives
+            buffer, overflow = b"", True
+        if lines:
+            yield lines
+    if overflow:
+        yield [None]
+    elif buffer:
+        yield [buffer]
+
+
+async def analyze_text_mood_bulk(chunks, fmt: str = "auto"):
+    """
+    Score a stream of texts, one per line. `chunks` is an async iterable of bytes (a request
+    body or an upload); results are yielded in input order, batch by batch, followed by a
+    summary with the corpus-wide mood distributions. Memory is bounded by the chunk
+    size, not the corpus size.
+
+    fmt: "ndjson" (each line a JSON string or {"text", "id"}), "text" (each line is a text)
+    or "auto" (lines starting with '{' or '"' are parsed as JSON).
+    Blank lines are skipped; lines that can't be parsed produce an error result.
+    """
+    if fmt not in BULK_FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+    totals = {
+        "count": 0,
+        "errors": 0,
+        "keywords": [0] * len(_MOOD_NAMES),
+        "dominant": {name: 0 for name in NEUTRAL_RESULT},
+        "mood_sum": {name: 0.0 for name in NEUTRAL_RESULT},
+    }
+    index = 0
+    async for lines in _split_lines(chunks):
+        lines = [line for line in lines if line is None or line.strip()]
+        # Score whatever has arrived, so results keep pace with a slowly streaming client
+        for start in range(0, len(lines), BULK_BATCH_SIZE):
+            batch = lines[start:start + BULK_BATCH_SIZE]
+            for result in await asyncio.to_thread(_score_batch, batch, index, fmt, totals):
+                yield result
+            index += len(batch)
+
+    count = totals["count"]
+    yield {
+        "status": "success",
+        "done": True,
+        "count": count,
+        "errors": totals["errors"],
+        # Pooled over every mood keyword in the corpus
+        "distribution": _percentages(totals["keywords"]),
+        # Share of texts per dominant mood
+        "dominant": {name: round(n / count * 100, 1) if count else 0.0 for name, n in totals["dominant"].items()},
+        # Mean of the per-text breakdowns
+        "mean": {name: round(total / count, 1) if count else 0.0 for name, total in totals["mood_sum"].items()},
+    }
@@ -0,0 +1,275 @@
+import os
+import glob
+import time
+import asyncio
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+import database
+import models
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, the sweeper runs in every process
+    fcntl = None
+
+# Generated audio is served by the /static mount from this directory
+OUTPUT_DIR = "static/audio"
+URL_PREFIX = "/static/audio"
+
+# Artifacts not downloaded for this long are deleted
+ARTIFACT_TTL_HOURS = int(os.getenv("ARTIFACT_TTL_HOURS", "72"))
+# Total size budget; least recently accessed artifacts go first once it is exceeded
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+ARTIFACT_SWEEP_SECONDS = int(os.getenv("ARTIFACT_SWEEP_SECONDS", "600"))
+# Temp files older than this are assumed to belong to a crashed request
+TEMP_FILE_MAX_AGE_SECONDS = int(os.getenv("TEMP_FILE_MAX_AGE_SECONDS", "3600"))
+
+# Leftovers of the old temp-file based uploads and mashups, relative to the backend working directory
+ORPHAN_TEMP_PATTERNS = ("temp_*", "temp1_*", "temp2_*", "static/temp/upload_*")
+
+# Only the process holding this lock sweeps; the others retry every ARTIFACT_SWEEP_SECONDS
+SWEEPER_LOCK_FILE = ".artifact_sweeper.lock"
+
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+_lock = threading.Lock()
+_pending_access = {}  # filename -> last access time, flushed to the database by the sweeper
+_sweeper_task = None
+_leader_lock = None
+
+
+def _now():
+    return datetime.utcnow()
+
+
+# ============= Layout =============
+
+def relative_path(filename: str) -> str:
+    """Two levels of hashed subdirectories (256 x 256) keep every directory small."""
+    digest = hashlib.sha1(filename.encode("utf-8")).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}/{filename}"
+
+
+def path_for(filename: str) -> str:
+    """Filesystem path an artifact is written to; parent directories are created."""
+    filepath = os.path.join(OUTPUT_DIR, *relative_path(filename).split("/"))
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    return filepath
+
+
+def url_for(filename: str) -> str:
+    return f"{URL_PREFIX}/{relative_path(filename)}"
+
+
+# ============= Metadata =============
+
+def register(filename: str, endpoint: str) -> str:
+    """Record (or refresh) an artifact after it has been written. Returns its URL."""
+    rel_path = relative_path(filename)
+    try:
+        size = os.path.getsize(os.path.join(OUTPUT_DIR, *rel_path.split("/")))
+    except OSError:
+        size = 0
+
+    now = _now()
+    try:
+        with database.SessionLocal() as db:
+            artifact = db.get(models.Artifact, filename)
+            if artifact is None:
+                db.add(models.Artifact(filename=filename, path=rel_path, endpoint=endpoint, size=size, created_at=now, last_access=now))
+            else:
+                artifact.size = size
+                artifact.last_access = now
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another worker registered the same (content-addressed) file first
+                db.rollback()
+    except Exception as e:
+        print(f"Artifact registration failed for {filename}: {e}")
+    return url_for(filename)
+
+
+async def publish(filename: str, endpoint: str) -> str:
+    """register() off the event loop."""
+    return await asyncio.to_thread(register, filename, endpoint)
+
+
+def touch(url_path: str):
+    """Note that an artifact was served. Batched in memory until the next sweep."""
+    filename = url_path.rsplit("/", 1)[-1]
+    if filename:
+        with _lock:
+            _pending_access[filename] = _now()
+
+
+def _flush_access():
+    with _lock:
+        pending = dict(_pending_access)
+        _pending_access.clear()
+    if not pending:
+        return
+    with database.SessionLocal() as db:
+        for filename, accessed in pending.items():
+            db.query(models.Artifact).filter(
+                models.Artifact.filename == filename
+            ).update({"last_access": accessed}, synchronize_session=False)
+        db.commit()
+
+
+# ============= Sweeper =============
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Could not remove {path}: {e}")
+
+
+def _adopt_untracked(db):
+    """
+    Register files that have no metadata (pre-sharding files at the top level and
+    artifacts written before a crash) and delete stale partial writes.
+    """
+    known = {filename for (filename,) in db.query(models.Artifact.filename)}
+    cutoff = time.time() - TEMP_FILE_MAX_AGE_SECONDS
+    candidates = [(root, name) for root, _, files in os.walk(OUTPUT_DIR) for name in files]
+
+    for root, name in candidates:
+        path = os.path.join(root, name)
+        if not os.path.isfile(path):
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if name.endswith(".tmp"):
+            # Partial write from an interrupted request
+            if st.st_mtime < cutoff:
+                _remove(path)
+            continue
+        if name in known:
+            continue
+        mtime = datetime.utcfromtimestamp(st.st_mtime)
+        db.add(models.Artifact(
+            filename=name,
+            path=os.path.relpath(path, OUTPUT_DIR).replace(os.sep, "/"),
+            endpoint="untracked",
+            size=st.st_size,
+            created_at=mtime,
+            last_access=mtime
+        ))
+        known.add(name)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+
+
+def _remove_orphan_temp_files():
+    cutoff = time.time() - TEMP_FILE_MAX_AGE_SECONDS
+    for pattern in ORPHAN_TEMP_PATTERNS:
+        for path in glob.glob(pattern):
+            try:
+                if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                    _remove(path)
+            except OSError:
+                pass
+
+
+def _evict(db, artifact):
+    _remove(os.path.join(OUTPUT_DIR, *artifact.path.split("/")))
+    db.delete(artifact)
+
+
+def sweep() -> dict:
+    """Apply the TTL and size quota, and clean up orphaned temp files."""
+    _flush_access()
+    expired = evicted = 0
+    with database.SessionLocal() as db:
+        _adopt_untracked(db)
+
+        cutoff = _now() - timedelta(hours=ARTIFACT_TTL_HOURS)
+        for artifact in db.query(models.Artifact).filter(models.Artifact.last_access < cutoff).all():
+            _evict(db, artifact)
+            expired += 1
+        db.commit()
+
+        total = db.query(func.coalesce(func.sum(models.Artifact.size), 0)).scalar()
+        if total > ARTIFACT_MAX_BYTES:
+            for artifact in db.query(models.Artifact).order_by(models.Artifact.last_access).all():
+                if total <= ARTIFACT_MAX_BYTES:
+                    break
+                total -= artifact.size or 0
+                _evict(db, artifact)
+                evicted += 1
+            db.commit()
+
+    _remove_orphan_temp_files()
+    if expired or evicted:
+        print(f"Artifact sweep removed {expired} expired and {evicted} over-quota file(s)")
+    return {"expired": expired, "evicted": evicted, "total_bytes": total}
+
+
+def get_stats():
+    with database.SessionLocal() as db:
+        rows = db.query(
+            models.Artifact.endpoint, func.count(models.Artifact.filename), func.coalesce(func.sum(models.Artifact.size), 0)
+        ).group_by(models.Artifact.endpoint).all()
+    by_endpoint = {endpoint: {"files": count, "bytes": size} for endpoint, count, size in rows}
+    return {
+        "files": sum(v["files"] for v in by_endpoint.values()),
+        "bytes": sum(v["bytes"] for v in by_endpoint.values()),
+        "max_bytes": ARTIFACT_MAX_BYTES,
+        "ttl_hours": ARTIFACT_TTL_HOURS,
+        "by_endpoint": by_endpoint,
+    }
+
+
+def _is_sweep_leader() -> bool:
+    """Take the sweeper lock if no other process holds it; kept until this process exits."""
+    global _leader_lock
+    if _leader_lock is not None or fcntl is None:
+        return True
+    lock = open(SWEEPER_LOCK_FILE, "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        return False
+    _leader_lock = lock
+    return True
+
+
+async def _sweep_loop():
+    while True:
+        try:
+            # Every process flushes its own access times; one of them sweeps
+            if _is_sweep_leader():
+                await asyncio.to_thread(sweep)
+            else:
+                await asyncio.to_thread(_flush_access)
+        except Exception as e:
+            print(f"Artifact sweep failed: {e}")
+        await asyncio.sleep(ARTIFACT_SWEEP_SECONDS)
+
+
+def start_sweeper():
+    global _sweeper_task
+    if _sweeper_task is None and ARTIFACT_SWEEP_SECONDS > 0:
+        _sweeper_task = asyncio.create_task(_sweep_loop())
+
+
+async def stop_sweeper():
+    global _sweeper_task
+    if _sweeper_task is not None:
+        _sweeper_task.cancel()
+        await asyncio.gather(_sweeper_task, return_exceptions=True)
+        _sweeper_task = None
+    # Keep access times seen since the last sweep
+    await asyncio.to_thread(_flush_access)
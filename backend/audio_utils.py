@@ -0,0 +1,354 @@
+import os
+import uuid
+import tempfile
+import subprocess
+import threading
+import numpy as np
+from pydub import AudioSegment
+import imageio_ffmpeg
+
+# Configure pydub to use bundled FFmpeg
+FFMPEG_EXE = imageio_ffmpeg.get_ffmpeg_exe()
+AudioSegment.converter = FFMPEG_EXE
+
+# Every decoded buffer shares one layout so segments can be mixed without resampling
+TARGET_FRAME_RATE = 44100
+TARGET_CHANNELS = 2
+SAMPLE_WIDTH = 2  # 16-bit signed PCM
+
+# Limits for user uploads, enforced before and during decoding
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+MAX_UPLOAD_SECONDS = int(os.getenv("MAX_UPLOAD_SECONDS", "900"))
+STREAM_CHUNK_BYTES = 256 * 1024
+
+
+class AudioLimitExceeded(ValueError):
+    """Raised when an upload is larger or longer than the configured limits."""
+
+
+def _decode_command(input_arg: str, frame_rate: int, channels: int) -> list:
+    """Build an ffmpeg command that writes raw s16le PCM to stdout."""
+    return [
+        FFMPEG_EXE, '-hide_banner', '-loglevel', 'error',
+        '-i', input_arg,
+        '-f', 's16le', '-acodec', 'pcm_s16le',
+        '-ac', str(channels), '-ar', str(frame_rate),
+        'pipe:1'
+    ]
+
+
+def _to_segment(pcm, frame_rate: int, channels: int):
+    # Drop a trailing partial frame, if any, so pydub accepts the buffer (only then is it copied)
+    frame_size = SAMPLE_WIDTH * channels
+    if len(pcm) % frame_size:
+        pcm = pcm[:len(pcm) - len(pcm) % frame_size]
+    if not pcm:
+        return None
+    return AudioSegment(data=pcm, sample_width=SAMPLE_WIDTH, frame_rate=frame_rate, channels=channels)
+
+
+def load_audio(source, frame_rate: int = TARGET_FRAME_RATE, channels: int = TARGET_CHANNELS):
+    """
+    Decode an audio file path or an open file-like upload into an AudioSegment by
+    piping ffmpeg's PCM output straight into memory (no ffprobe, no temporary WAV).
+    Returns None on failure; AudioLimitExceeded is raised for oversized uploads.
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        try:
+            return decode_stream(source, frame_rate, channels)
+        except AudioLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Audio decode from upload failed: {e}")
+            return None
+
+    if not os.path.exists(source):
+        return None
+
+    try:
+        proc = subprocess.run(
+            _decode_command(source, frame_rate, channels),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+        )
+        return _to_segment(proc.stdout, frame_rate, channels)
+    except Exception as e:
+        print(f"Audio decode failed for {source}: {e}")
+        return None
+
+
+def check_upload_size(size):
+    """Reject an upload whose declared size is over MAX_UPLOAD_BYTES."""
+    if size is not None and size > MAX_UPLOAD_BYTES:
+        raise AudioLimitExceeded(f"Upload is larger than the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit.")
+
+
+def feed_stdin(fileobj, stdin):
+    """Copy an upload into an ffmpeg input pipe chunk by chunk, stopping at the size limit."""
+    total = 0
+    try:
+        while True:
+            chunk = fileobj.read(STREAM_CHUNK_BYTES)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > MAX_UPLOAD_BYTES:
+                break
+            stdin.write(chunk)
+    except (BrokenPipeError, ValueError):
+        # ffmpeg stopped reading (error or killed at the duration limit)
+        pass
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+
+def file_descriptor(fileobj):
+    """OS descriptor of an open upload, or None if it has none (e.g. an in-memory buffer)."""
+    try:
+        return fileobj.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def decode_stream(fileobj, frame_rate: int = TARGET_FRAME_RATE, channels: int = TARGET_CHANNELS, max_seconds: int = MAX_UPLOAD_SECONDS):
+    """
+    Decode an open upload without copying it into Python memory first.
+    Disk-backed uploads are handed to ffmpeg by descriptor (seekable, so MP4/M4A work);
+    anything else is streamed through ffmpeg's stdin. Decoding is aborted as soon as
+    the output passes max_seconds.
+    """
+    pcm = bytearray()
+    with PcmDecoder(fileobj, frame_rate, channels, max_seconds) as decoder:
+        while True:
+            chunk = decoder.read_bytes(STREAM_CHUNK_BYTES // decoder.frame_size)
+            if not chunk:
+                break
+            pcm.extend(chunk)
+    # The segment wraps the buffer as is; copying it to bytes would double peak memory
+    return _to_segment(pcm, frame_rate, channels)
+
+
+class AudioDecodeError(RuntimeError):
+    """Raised when ffmpeg cannot decode an input."""
+
+
+class PcmDecoder:
+    """
+    An ffmpeg process decoding a path or an open upload to PCM that is read block by
+    block, so a render never has to hold a whole decoded track.
+
+        with PcmDecoder(upload) as decoder:
+            while (block := decoder.read(44100)) is not None:
+                ...  # float32 (frames, channels); the last block may be shorter
+
+    Uploads are passed like in decode_stream(). AudioLimitExceeded is raised once more
+    than max_seconds have been read, AudioDecodeError if ffmpeg fails.
+    """
+
+    def __init__(self, source, frame_rate: int = TARGET_FRAME_RATE, channels: int = TARGET_CHANNELS, max_seconds: int = MAX_UPLOAD_SECONDS):
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.frame_size = SAMPLE_WIDTH * channels
+        self.frames_read = 0
+        self._max_frames = max_seconds * frame_rate if max_seconds else None
+
+        fd = None
+        if isinstance(source, (str, os.PathLike)):
+            input_arg, pass_fds, stdin = os.fspath(source), (), subprocess.DEVNULL
+        else:
+            if hasattr(source, "seek"):
+                source.seek(0)
+            # SpooledTemporaryFile.fileno() rolls small in-memory uploads over to disk
+            fd = file_descriptor(source) if os.name == "posix" else None
+            if fd is not None:
+                input_arg, pass_fds, stdin = f"/dev/fd/{fd}", (fd,), subprocess.DEVNULL
+            else:
+                input_arg, pass_fds, stdin = "pipe:0", (), subprocess.PIPE
+
+        # stderr goes to a file so a chatty ffmpeg can't block on a full pipe
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(
+            _decode_command(input_arg, frame_rate, channels),
+            stdin=stdin, stdout=subprocess.PIPE, stderr=self._stderr, pass_fds=pass_fds
+        )
+        if stdin == subprocess.PIPE:
+            threading.Thread(target=feed_stdin, args=(source, self._proc.stdin), daemon=True).start()
+
+    def read_bytes(self, frames: int) -> bytes:
+        """Up to `frames` frames of s16le PCM; b"" once the input is exhausted."""
+        data = self._proc.stdout.read(frames * self.frame_size)
+        if len(data) < frames * self.frame_size:
+            # End of output: make sure it is the end of the input, not an error
+            if self._proc.wait() != 0:
+                self._stderr.seek(0)
+                raise AudioDecodeError(f"Audio decode failed: {self._stderr.read().decode('utf-8', 'replace').strip()}")
+            data = data[:len(data) - len(data) % self.frame_size]
+
+        self.frames_read += len(data) // self.frame_size
+        if self._max_frames and self.frames_read > self._max_frames:
+            raise AudioLimitExceeded(f"Audio is longer than the {self._max_frames // self.frame_rate} second limit.")
+        return data
+
+    def read(self, frames: int):
+        """Up to `frames` frames as float32 (frames, channels) in [-1, 1], or None at the end."""
+        data = self.read_bytes(frames)
+        if not data:
+            return None
+        return (np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0).reshape(-1, self.channels)
+
+    def close(self):
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.wait()
+        self._proc.stdout.close()
+        self._stderr.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def decode_bytes(data: bytes, frame_rate: int = TARGET_FRAME_RATE, channels: int = TARGET_CHANNELS):
+    """Decode an encoded in-memory buffer (MP3, WAV, WebM...) through ffmpeg's stdin."""
+    if not data:
+        return None
+
+    try:
+        proc = subprocess.run(
+            _decode_command('pipe:0', frame_rate, channels),
+            input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+        )
+        return _to_segment(proc.stdout, frame_rate, channels)
+    except Exception as e:
+        print(f"Audio decode from memory failed: {e}")
+        return None
+
+
+def to_array(segment: AudioSegment) -> np.ndarray:
+    """Return the samples of a 16-bit segment as float32 in [-1, 1], shaped (frames, channels)."""
+    samples = np.frombuffer(segment.raw_data, dtype=np.int16)
+    return (samples.astype(np.float32) / 32768.0).reshape(-1, segment.channels)
+
+
+def from_array(samples: np.ndarray, frame_rate: int = TARGET_FRAME_RATE) -> AudioSegment:
+    """Build a 16-bit AudioSegment from float samples shaped (frames,) or (frames, channels)."""
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype(np.int16)
+    return AudioSegment(data=pcm.tobytes(), sample_width=SAMPLE_WIDTH, frame_rate=frame_rate, channels=samples.shape[1])
+
+
+def _pcm_bytes(samples) -> bytes:
+    if isinstance(samples, AudioSegment):
+        return samples.raw_data
+    if isinstance(samples, np.ndarray):
+        if samples.dtype != np.int16:
+            samples = (np.clip(samples, -1.0, 1.0) * 32767.0).astype(np.int16)
+        return samples.tobytes()
+    return bytes(samples)
+
+
+def _channel_layout(count: int) -> str:
+    return {1: "mono", 2: "stereo"}.get(count, f"{count}c")
+
+
+class Mp3Encoder:
+    """
+    A long-lived ffmpeg process that MP3-encodes PCM as it is written, so a render
+    never has to hold (or export) the finished timeline as one AudioSegment.
+
+    Every entry of outputs is produced from the same pass. An output is a dict with
+    "path" and optionally "channels" (indices of the input channels it takes, e.g.
+    (2, 3) for a stem interleaved after the stereo mix) and "bitrate" (e.g. "192k").
+    Outputs are written to temporary files and only moved into place on close(), so
+    a failed or aborted render never leaves a partial MP3 behind.
+
+        with Mp3Encoder([{"path": mix_path}], channels=2) as encoder:
+            encoder.write(block)  # float (frames, channels), int16 array, bytes or AudioSegment
+    """
+
+    def __init__(self, outputs: list, channels: int = TARGET_CHANNELS, frame_rate: int = TARGET_FRAME_RATE):
+        self.outputs = outputs
+        self.channels = channels
+        self.frame_rate = frame_rate
+        self._tmp_paths = [f"{out['path']}.{uuid.uuid4().hex[:8]}.tmp" for out in outputs]
+
+        labels = [f"s{i}" for i in range(len(outputs))]
+        graph = [f"[0:a]asplit={len(outputs)}" + "".join(f"[{label}]" for label in labels)] if len(outputs) > 1 else []
+        command = [
+            FFMPEG_EXE, '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 's16le', '-ar', str(frame_rate), '-ac', str(channels), '-i', 'pipe:0'
+        ]
+        maps = []
+        for i, (out, tmp_path) in enumerate(zip(outputs, self._tmp_paths)):
+            source = f"[{labels[i]}]" if len(outputs) > 1 else "[0:a]"
+            picked = out.get("channels")
+            if picked:
+                routing = "|".join(f"c{n}=c{c}" for n, c in enumerate(picked))
+                graph.append(f"{source}pan={_channel_layout(len(picked))}|{routing}[o{i}]")
+            else:
+                graph.append(f"{source}anull[o{i}]")
+            maps += ['-map', f'[o{i}]']
+            if out.get("bitrate"):
+                maps += ['-b:a', out["bitrate"]]
+            maps += ['-f', 'mp3', tmp_path]
+        command += ['-filter_complex', ";".join(graph)] + maps
+
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr)
+
+    def write(self, samples):
+        """Append PCM (already laid out with `channels` interleaved channels) to every output."""
+        data = _pcm_bytes(samples)
+        if data:
+            try:
+                self._proc.stdin.write(data)
+            except BrokenPipeError:
+                raise RuntimeError(f"MP3 encoder stopped: {self._error_output()}")
+
+    def write_silence(self, duration_ms: float):
+        frames = int(self.frame_rate * (duration_ms / 1000.0))
+        self.write(bytes(frames * self.channels * SAMPLE_WIDTH))
+
+    def _error_output(self) -> str:
+        self._stderr.seek(0)
+        return self._stderr.read().decode("utf-8", "replace").strip()
+
+    def close(self) -> list:
+        """Finish encoding and publish the outputs. Returns their paths."""
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        if self._proc.wait() != 0:
+            error = self._error_output()
+            self.abort()
+            raise RuntimeError(f"MP3 encoding failed: {error}")
+        for out, tmp_path in zip(self.outputs, self._tmp_paths):
+            os.replace(tmp_path, out["path"])
+        self._stderr.close()
+        return [out["path"] for out in self.outputs]
+
+    def abort(self):
+        if self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        for tmp_path in self._tmp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._stderr.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -1,10 +1,5 @@
-import os
-import uuid
-import asyncio
-import edge_tts
-
-OUTPUT_DIR = "static/audio"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+import tts_service
+import artifact_store
 
 # Voice presets organized by age groups and tune styles
 VOICE_PRESETS = [
@@ -206,9 +201,6 @@ async def clone_voice(preset_id: str, text: str, mode: str = "speak"):
     if not preset:
         return {"status": "error", "error": "Voice preset not found"}
 
-    filename = f"clone_{uuid.uuid4().hex[:8]}.mp3"
-    filepath = os.path.join(OUTPUT_DIR, filename)
-
     # Apply voice modifications
     voice = preset["voice"]
     rate = preset["rate"]
@@ -228,13 +220,12 @@ async def clone_voice(preset_id: str, text: str, mode: str = "speak"):
             pitch = "+0Hz" 
     
     try:
-        communicate = edge_tts.Communicate(final_text, voice, rate=rate, pitch=pitch)
-        await communicate.save(filepath)
+        filename = await tts_service.synthesize_to_file(final_text, voice, prefix="clone", rate=rate, pitch=pitch)
 
         return {
             "status": "success",
             "filename": filename,
-            "url": f"/static/audio/{filename}",
+            "url": artifact_store.url_for(filename),
             "text": text,
             "preset_name": preset["name"],
             "category": preset["category"],
@@ -0,0 +1,133 @@
+import functools
+import numpy as np
+from synth import db_to_gain, low_pass
+
+# Vectorized effects for decoded tracks.
+# Signals are float32 arrays in [-1, 1] shaped (frames, channels), as returned by audio_utils.to_array.
+
+# FFT size used for block convolution; long impulse responses use the next power of two above 2x their length
+CONVOLUTION_FFT_SIZE = 1 << 16
+
+# WSOLA analysis frame, and how far (each way) a frame may move to line up with the previous one
+STRETCH_FRAME_MS = 46
+STRETCH_TOLERANCE_MS = 12
+
+
+def _frames(ms: float, sample_rate: int) -> int:
+    return int(sample_rate * ms / 1000.0)
+
+
+# ============= Gain =============
+
+def gain(samples: np.ndarray, db: float) -> np.ndarray:
+    return (samples * db_to_gain(db)).astype(np.float32)
+
+
+def peak_db(samples: np.ndarray) -> float:
+    peak = float(np.max(np.abs(samples))) if samples.size else 0.0
+    return 20 * np.log10(peak) if peak > 0 else -np.inf
+
+
+def normalize(samples: np.ndarray, headroom_db: float = 0.1) -> np.ndarray:
+    """Scale so the peak sits headroom_db below full scale (pydub's normalize)."""
+    peak = peak_db(samples)
+    if not np.isfinite(peak):
+        return samples
+    return gain(samples, -headroom_db - peak)
+
+
+# ============= Convolution =============
+
+def convolve(samples: np.ndarray, impulse: np.ndarray) -> np.ndarray:
+    """
+    Convolve each channel with its impulse response by FFT overlap-add. Output has
+    len(samples) + len(impulse) - 1 frames. impulse is (taps,) or (taps, channels).
+    Memory beyond the output is one FFT block, whatever the signal length.
+    """
+    if impulse.ndim == 1:
+        impulse = impulse[:, None]
+    frames, taps = len(samples), len(impulse)
+    n_fft = max(CONVOLUTION_FFT_SIZE, 1 << int(np.ceil(np.log2(2 * taps))))
+    block = n_fft - taps + 1
+    spectrum = np.fft.rfft(impulse, n_fft, axis=0)
+
+    out = np.zeros((frames + taps - 1, samples.shape[1]), dtype=np.float32)
+    for start in range(0, frames, block):
+        chunk = samples[start:start + block]
+        filtered = np.fft.irfft(np.fft.rfft(chunk, n_fft, axis=0) * spectrum, n_fft, axis=0)
+        end = min(len(out), start + n_fft)
+        out[start:end] += filtered[:end - start]
+    return out
+
+
+@functools.lru_cache(maxsize=16)
+def reverb_impulse(sample_rate: int, decay: float, channels: int, damping: float = 6000.0) -> np.ndarray:
+    """
+    Synthetic room response: exponentially decaying noise that falls 60 dB over `decay`
+    seconds, low-passed at `damping` Hz. Channels get independent noise for stereo width.
+    Scaled to unit energy so the wet signal is about as loud as the dry one.
+    """
+    taps = max(1, int(sample_rate * decay))
+    rng = np.random.default_rng(0)  # fixed seed: the same room every time
+    envelope = np.exp(np.log(1e-3) * np.arange(taps) / taps)
+    impulse = np.stack([
+        low_pass((rng.standard_normal(taps) * envelope).astype(np.float32), damping, sample_rate)
+        for _ in range(channels)
+    ], axis=1)
+    impulse /= np.sqrt(np.sum(impulse ** 2, axis=0))
+    impulse.setflags(write=False)
+    return impulse
+
+
+def reverb(samples: np.ndarray, sample_rate: int, wet: float = 0.3, decay: float = 1.5, predelay_ms: float = 20.0) -> np.ndarray:
+    """Convolution reverb; the output keeps the reverb tail (decay seconds longer than the input)."""
+    predelay = _frames(predelay_ms, sample_rate)
+    impulse = reverb_impulse(sample_rate, decay, samples.shape[1])
+    tail = convolve(samples, impulse)
+
+    out = np.zeros((predelay + len(tail), samples.shape[1]), dtype=np.float32)
+    out[:len(samples)] = samples * (1.0 - wet)
+    out[predelay:] += tail * wet
+    return out
+
+
+# ============= Time stretching =============
+
+def _best_offset(reference: np.ndarray, region: np.ndarray) -> int:
+    """Offset into region where a reference-length window correlates best with reference (mono)."""
+    n_fft = 1 << int(np.ceil(np.log2(len(region) + len(reference))))
+    correlation = np.fft.irfft(np.fft.rfft(region, n_fft) * np.conj(np.fft.rfft(reference, n_fft)), n_fft)
+    return int(np.argmax(correlation[:len(region) - len(reference) + 1]))
+
+
+def time_stretch(samples: np.ndarray, rate: float, sample_rate: int) -> np.ndarray:
+    """
+    Change tempo by `rate` (>1 faster, <1 slower) without changing pitch, by WSOLA:
+    Hann-windowed frames are overlap-added at a fixed hop, each taken from near its
+    nominal input position where it best continues the previously placed frame.
+    """
+    if rate == 1.0 or len(samples) == 0:
+        return samples
+    frame = _frames(STRETCH_FRAME_MS, sample_rate) // 2 * 2
+    hop = frame // 2
+    tolerance = _frames(STRETCH_TOLERANCE_MS, sample_rate)
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame) / frame)).astype(np.float32)[:, None]
+
+    out_frames = int(len(samples) / rate)
+    count = out_frames // hop + 1
+    # Pad so every candidate window lies inside the input
+    padded = np.zeros((tolerance + len(samples) + frame + tolerance + int(hop * rate) + 1, samples.shape[1]), dtype=np.float32)
+    padded[tolerance:tolerance + len(samples)] = samples
+    mono = padded.mean(axis=1)
+
+    out = np.zeros(((count + 1) * hop, samples.shape[1]), dtype=np.float32)
+    position = tolerance  # input position of the previous frame in padded coordinates
+    for k in range(count):
+        if k:
+            # The frame should continue where the previous one would have naturally gone on
+            target = tolerance + int(round(k * hop * rate))
+            reference = mono[position + hop:position + hop + frame]
+            low = min(max(0, target - tolerance), len(mono) - frame - 2 * tolerance)
+            position = low + _best_offset(reference, mono[low:low + frame + 2 * tolerance])
+        out[k * hop:k * hop + frame] += padded[position:position + frame] * window
+    return out[:out_frames]
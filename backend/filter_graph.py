@@ -0,0 +1,223 @@
+import os
+import re
+import uuid
+import tempfile
+import threading
+import subprocess
+import numpy as np
+from audio_utils import (
+    FFMPEG_EXE, TARGET_FRAME_RATE, MAX_UPLOAD_SECONDS, AudioDecodeError, AudioLimitExceeded,
+    feed_stdin, file_descriptor
+)
+
+# Studio renders compiled to a single ffmpeg filtergraph: input file(s) -> native C filters -> MP3.
+# Python never touches the samples. Only used for requests where every operation has a filter.
+
+# Same working format as the Python path (audio_utils.TARGET_*), in float so nothing clips between filters
+FORMAT = f"aformat=sample_fmts=flt:sample_rates={TARGET_FRAME_RATE}:channel_layouts=stereo"
+# ...and clipped to 16-bit at the end, like the PCM that audio_utils.Mp3Encoder is fed
+OUTPUT_FORMAT = "aformat=sample_fmts=s16"
+
+# "dsp" leaves reverb to the Python path (dsp.reverb's convolution); "echo" renders it in the
+# graph as a multi-tap echo, which is faster but audibly different
+STUDIO_GRAPH_REVERB = os.getenv("STUDIO_GRAPH_REVERB", "dsp")
+# Echo taps at mutually prime spacings avoid a flutter
+REVERB_TAPS_MS = (29, 37, 53, 71, 97, 131, 173, 227, 293, 379)
+
+_PEAK_PATTERN = re.compile(r"Peak level dB:\s*(-?inf|-?[\d.]+)")
+# Samples an input had past MAX_UPLOAD_SECONDS, from the astats@overrun<n> filters added by _run
+_OVERRUN_PATTERN = re.compile(r"\[astats@overrun\d+ @ [^\]]*\] Number of samples: (\d+)")
+
+
+# ============= Effect compilation =============
+
+def _tempo(rate: float) -> list:
+    """atempo only accepts 0.5-100 per instance; slower rates are chained."""
+    filters = []
+    while rate < 0.5:
+        filters.append("atempo=0.5")
+        rate /= 0.5
+    filters.append(f"atempo={rate:.6f}")
+    return filters
+
+
+def _reverb(wet: float, decay: float, predelay_ms: float) -> list:
+    """
+    Echo taps decaying 60 dB over `decay` seconds, scaled to unit energy like
+    dsp.reverb_impulse. The input is padded so the tail rings out, as in dsp.reverb.
+    """
+    delays = [predelay_ms + tap for tap in REVERB_TAPS_MS]
+    if wet <= 0:
+        return [f"apad=pad_dur={predelay_ms / 1000.0 + decay:.3f}"]
+    # aecho itself runs on for its longest delay after the input ends
+    filters = [f"apad=pad_dur={max(0.0, (predelay_ms - max(delays)) / 1000.0 + decay):.3f}"]
+    decays = np.power(10.0, -3.0 * np.array(delays) / 1000.0 / decay)
+    decays = np.maximum(wet * decays / np.sqrt(np.sum(decays ** 2)), 1e-6)
+    filters.append(
+        f"aecho=in_gain={1.0 - wet:.6f}:out_gain=1"
+        f":delays={'|'.join(f'{d:g}' for d in delays)}"
+        f":decays={'|'.join(f'{d:.6f}' for d in decays)}"
+    )
+    return filters
+
+
+# effect -> fn(**params) -> filters. "enhance" is resolved in render_effects (it needs the peak).
+EFFECT_FILTERS = {
+    "speed_up": _tempo,
+    "slowed": _tempo,
+    "gain": lambda db: [f"volume={db:.3f}dB"],
+    "enhance": None,
+}
+if STUDIO_GRAPH_REVERB == "echo":
+    EFFECT_FILTERS["reverb"] = _reverb
+
+
+def _seekable(source) -> bool:
+    return isinstance(source, (str, os.PathLike)) or file_descriptor(source) is not None
+
+
+def supports_effects(chain: list, source) -> bool:
+    """True if every step has a native filter (peak normalization also needs to read the input twice)."""
+    if os.name != "posix" or any(step["name"] not in EFFECT_FILTERS for step in chain):
+        return False
+    return _seekable(source) or all(step["name"] != "enhance" for step in chain)
+
+
+def supports_mashup() -> bool:
+    return os.name == "posix"
+
+
+# ============= Running =============
+
+def _limit_inputs(count: int, graph: str) -> tuple:
+    """
+    Route each input [n:a] through an asplit whose second branch keeps only the audio past
+    MAX_UPLOAD_SECONDS and counts it into a null output, so every input is read to the end
+    (at most MAX_UPLOAD_SECONDS + 1, see _run) even when the graph stops early.
+    Returns the graph and the extra output arguments.
+    """
+    branches, output_args = [], []
+    for n in range(count):
+        graph = graph.replace(f"[{n}:a]", f"[in{n}]")
+        branches.append(
+            f"[{n}:a]asplit=2[in{n}][tail{n}];[tail{n}]atrim=start={MAX_UPLOAD_SECONDS},"
+            f"astats@overrun{n}=measure_perchannel=none:measure_overall=Number_of_samples[overrun{n}]"
+        )
+        output_args += ['-map', f'[overrun{n}]', '-f', 'null', '-']
+    return ";".join(branches + [graph]), output_args
+
+
+def _run(sources: list, graph: str, output_args: list, check_limit: bool = True) -> str:
+    """
+    Run ffmpeg over the sources (paths or open uploads) with a -filter_complex graph.
+    Uploads with a descriptor are read through /dev/fd, others are fed through a pipe.
+    With check_limit, AudioLimitExceeded is raised if an input is longer than
+    MAX_UPLOAD_SECONDS, as when decoding in Python. Returns ffmpeg's log.
+    """
+    command = [FFMPEG_EXE, '-hide_banner', '-nostats', '-loglevel', 'info', '-y']
+    pass_fds, pipes = [], []
+    for source in sources:
+        if isinstance(source, (str, os.PathLike)):
+            input_arg = os.fspath(source)
+        else:
+            if hasattr(source, "seek"):
+                source.seek(0)
+            fd = file_descriptor(source)
+            if fd is None:
+                fd, write_fd = os.pipe()
+                pipes.append((fd, source, os.fdopen(write_fd, "wb")))
+            input_arg = f"/dev/fd/{fd}"
+            pass_fds.append(fd)
+        # Decoding stops a second past the limit: enough to tell that the input is too long
+        command += ['-t', str(MAX_UPLOAD_SECONDS + 1), '-i', input_arg]
+    if check_limit:
+        graph, limit_args = _limit_inputs(len(sources), graph)
+        output_args = output_args + limit_args
+    command += ['-filter_complex', graph] + output_args
+
+    with tempfile.TemporaryFile() as log:
+        try:
+            proc = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=log, pass_fds=pass_fds)
+        except Exception:
+            for read_fd, _, writer in pipes:
+                writer.close()
+            raise
+        finally:
+            # The child has its own copy of each pipe's read end
+            for read_fd, _, _ in pipes:
+                os.close(read_fd)
+        for _, source, writer in pipes:
+            threading.Thread(target=feed_stdin, args=(source, writer), daemon=True).start()
+        returncode = proc.wait()
+        log.seek(0)
+        output = log.read().decode("utf-8", "replace")
+    if returncode != 0:
+        raise AudioDecodeError(f"ffmpeg filtergraph failed: {output.strip()[-2000:]}")
+    if check_limit and any(int(samples) for samples in _OVERRUN_PATTERN.findall(output)):
+        raise AudioLimitExceeded(f"Audio is longer than the {MAX_UPLOAD_SECONDS} second limit.")
+    return output
+
+
+def _encode(sources: list, graph: str, filepath: str):
+    """Run a graph whose output pad is [out] into an MP3, published only once complete."""
+    tmp_path = f"{filepath}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        _run(sources, graph, ['-map', '[out]', '-f', 'mp3', tmp_path])
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _measure_peak(source, filters: list) -> float:
+    """Peak level (dBFS) of the input after the given filters, from a decode-only pass."""
+    # The length is checked by the encode pass that follows
+    log = _run([source], f"[0:a]{','.join(filters + ['astats'])}[out]", ['-map', '[out]', '-f', 'null', '-'], check_limit=False)
+    # astats reports every channel, then the overall figures last
+    levels = _PEAK_PATTERN.findall(log)
+    if not levels:
+        raise AudioDecodeError("ffmpeg did not report a peak level")
+    return float(levels[-1])
+
+
+def render_effects(source, chain: list, filepath: str) -> str:
+    """
+    Render an effect chain (studio_service.parse_effects output) as one ffmpeg process.
+    Peak normalization ("enhance") measures the chain so far in a decode-only pass first.
+    """
+    filters = [FORMAT]
+    for step in chain:
+        if step["name"] == "enhance":
+            peak = _measure_peak(source, filters)
+            if np.isfinite(peak):
+                filters.append(f"volume={-step['params']['headroom_db'] - peak:.4f}dB")
+        else:
+            filters += EFFECT_FILTERS[step["name"]](**step["params"])
+    _encode([source], f"[0:a]{','.join(filters + [OUTPUT_FORMAT])}[out]", filepath)
+    return filepath
+
+
+# ============= Mashups =============
+
+def mashup_graph(gain1: float, gain2: float, offset_ms: float, fade_ms: float) -> str:
+    """
+    Same mix as studio_service's block mixer: each track gained and hard-clipped, track 2
+    faded in and delayed, summed without amix's 1/n scaling. The mix ends with the shorter
+    track; when track 2 is delayed, a silent undelayed copy of it keeps amix to that length.
+    """
+    track1 = f"[0:a]{FORMAT},volume={gain1:.6f},asoftclip=type=hard[t1]"
+    track2 = f"[1:a]{FORMAT},volume={gain2:.6f},asoftclip=type=hard"
+    if fade_ms:
+        track2 += f",afade=t=in:st=0:d={fade_ms / 1000.0:.3f}"
+    if not offset_ms:
+        return f"{track1};{track2}[t2];[t1][t2]amix=inputs=2:duration=shortest:normalize=0,{OUTPUT_FORMAT}[out]"
+    return (
+        f"{track1};{track2},asplit=2[t2][ref];"
+        f"[t2]adelay={offset_ms:g}:all=1[late];[ref]volume=0[length];"
+        f"[t1][late][length]amix=inputs=3:duration=shortest:normalize=0,{OUTPUT_FORMAT}[out]"
+    )
+
+
+def render_mashup(source1, source2, gain1: float, gain2: float, offset_ms: float, fade_ms: float, filepath: str) -> str:
+    _encode([source1, source2], mashup_graph(gain1, gain2, offset_ms, fade_ms), filepath)
+    return filepath
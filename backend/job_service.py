@@ -0,0 +1,308 @@
+import os
+import json
+import uuid
+import socket
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+import database
+import models
+import lyrics_service
+import podcast_service
+import story_service
+import music_service
+
+# Job workers started inside each web worker. Results are written to the web service's own
+# static/audio, so this is where jobs run unless `python job_worker.py` is deployed on hosts
+# that share that directory and a non-SQLite database (then set this to 0).
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+# Concurrent jobs in a standalone job_worker.py process
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+# How often idle workers poll the queue and running jobs report progress/heartbeat
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+# A running job whose heartbeat is older than this is considered orphaned (worker died)
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs (and their status records) are kept this long
+JOB_RETENTION_HOURS = int(os.getenv("JOB_RETENTION_HOURS", "24"))
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+_worker_tasks = []
+
+
+def _now():
+    return datetime.utcnow()
+
+
+# ============= Job kinds =============
+
+async def _run_song(params, progress):
+    return await lyrics_service.generate_lyrics_with_translation(
+        prompt=params["prompt"],
+        genre=params.get("genre", ""),
+        duration=params.get("duration", 10),
+        language=params.get("language", "en"),
+        target_lang=params.get("target_lang"),
+        vocal_stem=params.get("vocal_stem", False),
+        progress=progress
+    )
+
+
+async def _run_podcast(params, progress):
+    return await podcast_service.generate_podcast(
+        params["topic"], params.get("duration", 1), params.get("voices"), progress=progress
+    )
+
+
+async def _run_story(params, progress):
+    return await story_service.generate_story(
+        params["genre"], params.get("topic", ""), params.get("age_group", "child"),
+        params.get("language", "en"), params.get("duration", 2), progress=progress
+    )
+
+
+async def _run_music(params, progress):
+    return await music_service.generate_music(params["instrument"], params.get("duration", 10), progress=progress)
+
+
+JOB_KINDS = {
+    "song": _run_song,
+    "podcast": _run_podcast,
+    "story": _run_story,
+    "music": _run_music,
+}
+
+
+# ============= Queue (database) operations =============
+
+def _serialize(job: models.RenderJob) -> dict:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": round(job.progress or 0.0, 3),
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at.isoformat() + "Z" if job.created_at else None,
+        "started_at": job.started_at.isoformat() + "Z" if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() + "Z" if job.finished_at else None,
+    }
+
+
+def submit_job(kind: str, params: dict) -> dict:
+    """Queue a render and return its status record."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    job = models.RenderJob(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        params=json.dumps(params),
+        status="queued",
+        stage="queued",
+        progress=0.0,
+        cancel_requested=False,
+        attempts=0,
+        created_at=_now()
+    )
+    with database.SessionLocal() as db:
+        db.add(job)
+        db.commit()
+        return _serialize(job)
+
+
+def get_job(job_id: str):
+    with database.SessionLocal() as db:
+        job = db.get(models.RenderJob, job_id)
+        return _serialize(job) if job else None
+
+
+def cancel_job(job_id: str):
+    """
+    Cancel a job. A queued job is cancelled immediately; a running job is flagged and
+    stopped by its worker at the next heartbeat. Returns the updated record, or None.
+    """
+    with database.SessionLocal() as db:
+        # Conditional update so a worker claiming the job at the same time can't lose the cancel
+        cancelled = db.query(models.RenderJob).filter(
+            models.RenderJob.id == job_id, models.RenderJob.status == "queued"
+        ).update({"status": "cancelled", "stage": "cancelled", "finished_at": _now()}, synchronize_session=False)
+        if not cancelled:
+            db.query(models.RenderJob).filter(
+                models.RenderJob.id == job_id, models.RenderJob.status == "running"
+            ).update({"cancel_requested": True}, synchronize_session=False)
+        db.commit()
+        job = db.get(models.RenderJob, job_id)
+        return _serialize(job) if job else None
+
+
+def _claim_next(worker_id: str):
+    """Atomically move the oldest queued job to running. Returns (id, kind, params) or None."""
+    with database.SessionLocal() as db:
+        while True:
+            job = db.query(models.RenderJob).filter(
+                models.RenderJob.status == "queued"
+            ).order_by(models.RenderJob.created_at).first()
+            if job is None:
+                return None
+
+            now = _now()
+            # Only one worker's UPDATE can match while the row is still queued
+            claimed = db.query(models.RenderJob).filter(
+                models.RenderJob.id == job.id, models.RenderJob.status == "queued"
+            ).update({
+                "status": "running",
+                "stage": "starting",
+                "worker_id": worker_id,
+                "attempts": models.RenderJob.attempts + 1,
+                "started_at": now,
+                "heartbeat_at": now
+            }, synchronize_session=False)
+            db.commit()
+            if claimed:
+                return job.id, job.kind, json.loads(job.params or "{}")
+            db.expire_all()
+
+
+def _heartbeat(job_id: str, worker_id: str, stage: str, progress: float) -> bool:
+    """Record progress for a running job. Returns True if the job should stop (cancelled or re-claimed)."""
+    with database.SessionLocal() as db:
+        db.query(models.RenderJob).filter(
+            models.RenderJob.id == job_id, models.RenderJob.worker_id == worker_id
+        ).update({"stage": stage, "progress": progress, "heartbeat_at": _now()}, synchronize_session=False)
+        db.commit()
+        job = db.get(models.RenderJob, job_id)
+        return job is None or job.worker_id != worker_id or bool(job.cancel_requested)
+
+
+def _finish(job_id: str, worker_id: str, status: str, result=None, error=None):
+    values = {"status": status, "stage": status, "finished_at": _now(), "error": error}
+    if status == "succeeded":
+        values["progress"] = 1.0
+    if result is not None:
+        values["result"] = json.dumps(result)
+    with database.SessionLocal() as db:
+        # Guarded by worker_id: a job that was recovered and re-claimed elsewhere is left alone
+        db.query(models.RenderJob).filter(
+            models.RenderJob.id == job_id, models.RenderJob.worker_id == worker_id,
+            models.RenderJob.status == "running"
+        ).update(values, synchronize_session=False)
+        db.commit()
+
+
+def recover_stale_jobs() -> int:
+    """Requeue running jobs whose worker stopped heartbeating (crash, deploy, OOM kill)."""
+    cutoff = _now() - timedelta(seconds=JOB_STALE_SECONDS)
+    with database.SessionLocal() as db:
+        stale = db.query(models.RenderJob).filter(
+            models.RenderJob.status == "running",
+            or_(models.RenderJob.heartbeat_at == None, models.RenderJob.heartbeat_at < cutoff)  # noqa: E711
+        ).all()
+        for job in stale:
+            if job.cancel_requested:
+                job.status, job.stage = "cancelled", "cancelled"
+                job.finished_at = _now()
+            elif (job.attempts or 0) >= JOB_MAX_ATTEMPTS:
+                job.status, job.stage = "failed", "failed"
+                job.error = "Job was interrupted too many times."
+                job.finished_at = _now()
+            else:
+                job.status, job.stage, job.progress = "queued", "queued", 0.0
+                job.worker_id = None
+        db.commit()
+        if stale:
+            print(f"Recovered {len(stale)} interrupted render job(s)")
+        return len(stale)
+
+
+def purge_finished_jobs() -> int:
+    """Delete status records of jobs that finished more than JOB_RETENTION_HOURS ago."""
+    cutoff = _now() - timedelta(hours=JOB_RETENTION_HOURS)
+    with database.SessionLocal() as db:
+        deleted = db.query(models.RenderJob).filter(
+            models.RenderJob.status.in_(TERMINAL_STATUSES),
+            models.RenderJob.finished_at < cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+
+# ============= Workers =============
+
+async def _execute(job_id: str, kind: str, params: dict, worker_id: str):
+    state = {"stage": "starting", "progress": 0.0}
+
+    def progress(stage: str, fraction: float):
+        # Called from the service on the event loop; the monitor below persists it
+        state["stage"] = stage
+        state["progress"] = max(0.0, min(1.0, fraction))
+
+    task = asyncio.create_task(JOB_KINDS[kind](params, progress))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=JOB_POLL_SECONDS)
+            if done:
+                break
+            cancel = await asyncio.to_thread(_heartbeat, job_id, worker_id, state["stage"], state["progress"])
+            if cancel:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await asyncio.to_thread(_finish, job_id, worker_id, "cancelled")
+                return
+
+        result = task.result()
+        if isinstance(result, dict) and result.get("status") == "error":
+            await asyncio.to_thread(_finish, job_id, worker_id, "failed", result, result.get("error"))
+        else:
+            await asyncio.to_thread(_finish, job_id, worker_id, "succeeded", result)
+    except asyncio.CancelledError:
+        # Worker shutting down: leave the job running so recovery requeues it
+        task.cancel()
+        raise
+    except Exception as e:
+        print(f"Render job {job_id} ({kind}) failed: {e}")
+        await asyncio.to_thread(_finish, job_id, worker_id, "failed", None, str(e))
+
+
+async def _worker_loop(worker_id: str):
+    while True:
+        try:
+            claimed = await asyncio.to_thread(_claim_next, worker_id)
+        except Exception as e:
+            print(f"Job queue poll failed: {e}")
+            claimed = None
+
+        if claimed is None:
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            continue
+        await _execute(*claimed, worker_id)
+
+
+async def _maintenance_loop():
+    while True:
+        try:
+            await asyncio.to_thread(recover_stale_jobs)
+            await asyncio.to_thread(purge_finished_jobs)
+        except Exception as e:
+            print(f"Job maintenance failed: {e}")
+        await asyncio.sleep(max(JOB_STALE_SECONDS / 2, JOB_POLL_SECONDS))
+
+
+def start_workers(count: int = JOB_WORKERS):
+    """Start job workers on the running event loop (called from app startup)."""
+    if count <= 0 or _worker_tasks:
+        return
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    _worker_tasks.append(asyncio.create_task(_maintenance_loop()))
+    for n in range(count):
+        _worker_tasks.append(asyncio.create_task(_worker_loop(f"{prefix}:{n}")))
+
+
+async def stop_workers():
+    for task in _worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
@@ -0,0 +1,35 @@
+"""
+Standalone render worker: `python job_worker.py [workers]`.
+
+Pulls jobs from the same database as the web app, so render capacity can be run in
+separate processes or on separate nodes. Only usable where the worker shares the web
+tier's static/audio (results are written there and served by the web app) and its
+DATABASE_URL; a SQLite URL is refused, since it would be a private copy of the queue.
+Set JOB_WORKERS=0 on the web tier to keep renders off it entirely.
+"""
+import sys
+import asyncio
+import database
+import models
+import job_service
+import render_pool
+
+
+async def main(count: int):
+    job_service.start_workers(count)
+    print(f"Render job worker started with {count} worker(s)")
+    try:
+        await asyncio.gather(*job_service._worker_tasks)
+    finally:
+        render_pool.shutdown()
+
+
+if __name__ == "__main__":
+    if database.engine.url.get_backend_name() == "sqlite":
+        sys.exit("job_worker.py needs the web app's DATABASE_URL; refusing to start on SQLite.")
+    models.Base.metadata.create_all(bind=database.engine)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else max(1, job_service.JOB_WORKER_CONCURRENCY)
+    try:
+        asyncio.run(main(count))
+    except KeyboardInterrupt:
+        pass
@@ -1,11 +1,10 @@
 import os
 import uuid
 import asyncio
-import edge_tts
 import random
-from deep_translator import GoogleTranslator
+import translator
 from pydub import AudioSegment
-from pydub.generators import Sine, Square, Sawtooth, Triangle, WhiteNoise
+import numpy as np
 import imageio_ffmpeg
 
 # Configure pydub to use bundled FFmpeg
@@ -16,39 +15,17 @@ os.environ["PATH"] += os.pathsep + os.path.dirname(ffmpeg_exe)
 
 # Import language mapping from translate_service to reuse voice definitions
 from translate_service import LANGUAGE_VOICES
+import tts_service
+import render_pool
+import synth
+from audio_utils import to_array, Mp3Encoder
+import artifact_store
 
-OUTPUT_DIR = "static/audio"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Frames mixed and handed to the encoder at a time when rendering a song
+RENDER_BLOCK_FRAMES = 44100
 
-def _load_audio_workaround(filepath):
-    """
-    Workaround for missing ffprobe: Convert MP3 to WAV using ffmpeg 
-    and load the WAV using pydub.
-    """
-    if not os.path.exists(filepath):
-        return None
-        
-    try:
-        # If it's already a wav, load it
-        if filepath.endswith('.wav'):
-            return AudioSegment.from_wav(filepath)
-            
-        # Convert to wav
-        wav_path = filepath.replace('.mp3', '_temp.wav')
-        ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
-        import subprocess
-        subprocess.run([ffmpeg_exe, '-i', filepath, '-y', wav_path], stderr=subprocess.DEVNULL, check=True)
-        
-        audio = AudioSegment.from_wav(wav_path)
-        
-        # Cleanup temp wav
-        if os.path.exists(wav_path):
-            os.remove(wav_path)
-            
-        return audio
-    except Exception as e:
-        print(f"Audio load workaround failed: {e}")
-        return None
+# Maximum number of song sections synthesized at the same time
+SECTION_SYNTH_CONCURRENCY = int(os.getenv("SONG_SYNTH_CONCURRENCY", "4"))
 
 # ============= Lyrics Templates by Genre =============
 SONG_STRUCTURES = {
@@ -164,6 +141,24 @@ EMOTIONAL_PRESETS = {
 }
 
 
+def _section_type(line: str):
+    """Section type for structural lines such as 'Verse 1:' or 'Final Chorus:', otherwise None."""
+    lower_line = line.strip().lower()
+    new_section_type = None
+
+    if "intro" in lower_line: new_section_type = "intro"
+    elif "verse" in lower_line: new_section_type = "verse"
+    elif "chorus" in lower_line:
+        if "final" in lower_line: new_section_type = "final"
+        else: new_section_type = "chorus"
+    elif "bridge" in lower_line: new_section_type = "bridge"
+    elif "outro" in lower_line: new_section_type = "outro"
+
+    if new_section_type and (lower_line.endswith(':') or len(lower_line.split()) <= 2):
+        return new_section_type
+    return None
+
+
 def _parse_lyrics_into_sections(lyrics: str) -> list:
     """Split lyrics into logical sections (Verse, Chorus, etc.) for sectional synthesis."""
     lines = lyrics.split('\n')
@@ -175,18 +170,8 @@ def _parse_lyrics_into_sections(lyrics: str) -> list:
         if not line:
             continue
             
-        lower_line = line.lower()
-        new_section_type = None
-        
-        if "intro" in lower_line: new_section_type = "intro"
-        elif "verse" in lower_line: new_section_type = "verse"
-        elif "chorus" in lower_line: 
-            if "final" in lower_line: new_section_type = "final"
-            else: new_section_type = "chorus"
-        elif "bridge" in lower_line: new_section_type = "bridge"
-        elif "outro" in lower_line: new_section_type = "outro"
-        
-        if new_section_type and (line.endswith(':') or len(line.split()) <= 2):
+        new_section_type = _section_type(line)
+        if new_section_type:
             if current_section["lines"]:
                 sections.append(current_section)
             current_section = {"type": new_section_type, "lines": []}
@@ -199,6 +184,51 @@ def _parse_lyrics_into_sections(lyrics: str) -> list:
     return sections
 
 
+def _lyric_blocks(lyrics: str) -> list:
+    """
+    Split lyrics into label lines, blank lines and blocks of consecutive lyric lines,
+    as (section type or None, text) pairs. Joining the texts with newlines restores the lyrics.
+    """
+    blocks = []
+    for line in lyrics.split('\n'):
+        section_type = _section_type(line) if line.strip() else None
+        if section_type or not line.strip():
+            blocks.append((section_type, line))
+        elif blocks and blocks[-1][0] is None and blocks[-1][1].strip():
+            blocks[-1] = (None, blocks[-1][1] + '\n' + line)
+        else:
+            blocks.append((None, line))
+    return blocks
+
+
+async def _translate_lyrics(lyrics: str, target_lang: str) -> tuple:
+    """
+    Translate lyrics one block at a time, so each verse keeps its context and a
+    repeated chorus is only translated once. Section labels are translated too.
+    Returns (translated lyrics, sections): the sections are typed from the original
+    labels, since the translated ones no longer parse.
+    """
+    blocks = _lyric_blocks(lyrics)
+    to_translate = [text for _, text in blocks if text.strip()]
+    translated = await translator.translate_batch(to_translate, target_lang)
+    lookup = dict(zip(to_translate, translated))
+
+    texts, sections = [], []
+    current_section = {"type": "default", "lines": []}
+    for section_type, text in blocks:
+        text = (lookup.get(text) or text) if text.strip() else text
+        texts.append(text)
+        if section_type:
+            if current_section["lines"]:
+                sections.append(current_section)
+            current_section = {"type": section_type, "lines": []}
+        else:
+            current_section["lines"] += [l.strip() for l in text.split('\n') if l.strip()]
+    if current_section["lines"]:
+        sections.append(current_section)
+    return "\n".join(texts), sections
+
+
 def _generate_lyrics(prompt: str, genre: str = "", language: str = "en") -> str:
     """Generate song lyrics based on the user's prompt and genre."""
     genre_info = SONG_STRUCTURES.get(genre, SONG_STRUCTURES.get("pop"))
@@ -339,10 +369,15 @@ def _format_lyrics_for_singing(lyrics: str) -> str:
     return " ... ".join(singing_lines)
 
 
-def _generate_background_music(genre: str, duration_ms: int) -> AudioSegment:
+# Rendered one-bar loops per genre, filled on first use (per process)
+_BAR_LOOP_CACHE = {}
+
+
+def _render_bar_loop(genre: str) -> np.ndarray:
     """
-    Generate sophisticated background music using procedural synthesis.
+    Render one bar of procedural backing music for a genre.
     Creates unique textures, melodies, and drum patterns based on the genre.
+    Every layer is rendered as a float32 array and mixed by addition.
     """
     genre_info = SONG_STRUCTURES.get(genre, SONG_STRUCTURES.get("pop"))
     tempo = genre_info.get("tempo", 120)
@@ -354,31 +389,28 @@ def _generate_background_music(genre: str, duration_ms: int) -> AudioSegment:
     # 1. Procedural Drum Kit Synthesis
     def get_kick():
         # Punchy low sine swoop
-        k = Sine(60).to_audio_segment(duration=100, volume=-10).fade_out(80)
-        return k + AudioSegment.silent(duration=beat_ms - 100)
+        return synth.fade_out(synth.sine(60, 100, volume=-10), 80)
 
     def get_snare():
         # Noise burst for snare
-        s = WhiteNoise().to_audio_segment(duration=80, volume=-15).high_pass_filter(1000).fade_out(60)
-        return s + AudioSegment.silent(duration=beat_ms - 80)
+        return synth.fade_out(synth.high_pass(synth.white_noise(80, volume=-15), 1000), 60)
 
     def get_hat():
         # High pitched noise tick
-        h = WhiteNoise().to_audio_segment(duration=30, volume=-22).high_pass_filter(5000).fade_out(20)
-        return h + AudioSegment.silent(duration=beat_ms // 2 - 30)
+        return synth.fade_out(synth.high_pass(synth.white_noise(30, volume=-22), 5000), 20)
 
     # 2. Generator Selection by Genre
     gen_map = {
-        "rock": Sawtooth,
-        "electronic": Square,
-        "pop": Triangle,
-        "hiphop": Square,
-        "lofi": Square,
-        "jazz": Sine,
-        "bollywood": Sine,
-        "indian_classical": Sine,
+        "rock": synth.sawtooth,
+        "electronic": synth.square,
+        "pop": synth.triangle,
+        "hiphop": synth.square,
+        "lofi": synth.square,
+        "jazz": synth.sine,
+        "bollywood": synth.sine,
+        "indian_classical": synth.sine,
     }
-    Generator = gen_map.get(genre, Sine)
+    generator = gen_map.get(genre, synth.sine)
     
     # Base volume for genre
     vol = -24
@@ -386,84 +418,207 @@ def _generate_background_music(genre: str, duration_ms: int) -> AudioSegment:
     if genre == "lofi": vol = -28
     
     # 3. Build a 1-bar pattern
-    bar = AudioSegment.silent(duration=bar_ms)
+    bar = np.zeros(synth.sample_count(bar_ms), dtype=np.float32)
     
     # A. Harmonic/Melodic Layer
     for i, freq in enumerate(notes):
         # Instrument 1: Main Chord/Lead
-        inst1 = Generator(freq).to_audio_segment(duration=beat_ms, volume=vol).fade_out(50)
+        inst1 = synth.fade_out(generator(freq, beat_ms, volume=vol), 50)
         
         # Instrument 2: Sub-harmonic or Octave
         if genre in ["rock", "electronic"]:
-            inst2 = Sawtooth(freq / 2).to_audio_segment(duration=beat_ms, volume=vol-6).fade_out(50)
-            inst1 = inst1.overlay(inst2)
+            inst1 = inst1 + synth.fade_out(synth.sawtooth(freq / 2, beat_ms, volume=vol-6), 50)
         elif genre in ["bollywood", "indian_classical"]:
-            inst2 = Sine(freq * 2).to_audio_segment(duration=beat_ms, volume=vol-10).fade_out(50)
-            inst1 = inst1.overlay(inst2)
+            inst1 = inst1 + synth.fade_out(synth.sine(freq * 2, beat_ms, volume=vol-10), 50)
             
-        bar = bar.overlay(inst1, position=i * beat_ms)
+        synth.mix_into(bar, inst1, position_ms=i * beat_ms)
 
     # B. Rhythmic Layer (Drums)
     if genre in ["pop", "rock", "hiphop", "electronic", "bollywood"]:
         # Standard 4/4: Kick on 1 & 3, Snare on 2 & 4
-        bar = bar.overlay(get_kick(), position=0)
-        bar = bar.overlay(get_snare(), position=beat_ms)
-        bar = bar.overlay(get_kick(), position=beat_ms * 2)
-        bar = bar.overlay(get_snare(), position=beat_ms * 3)
+        synth.mix_into(bar, get_kick(), position_ms=0)
+        synth.mix_into(bar, get_snare(), position_ms=beat_ms)
+        synth.mix_into(bar, get_kick(), position_ms=beat_ms * 2)
+        synth.mix_into(bar, get_snare(), position_ms=beat_ms * 3)
         
         # Hi-hats every half beat
         for h_step in range(8):
-            bar = bar.overlay(get_hat(), position=h_step * (beat_ms // 2))
+            synth.mix_into(bar, get_hat(), position_ms=h_step * (beat_ms // 2))
 
     elif genre == "lofi":
         # Boom-bap: Kick on 1, Snare on 2 & 4, soft kick on 3.5
-        bar = bar.overlay(get_kick() - 4, position=0)
-        bar = bar.overlay(get_snare() - 6, position=beat_ms)
-        bar = bar.overlay(get_kick() - 8, position=int(beat_ms * 2.5))
-        bar = bar.overlay(get_snare() - 6, position=beat_ms * 3)
+        synth.mix_into(bar, get_kick(), position_ms=0, gain_db=-4)
+        synth.mix_into(bar, get_snare(), position_ms=beat_ms, gain_db=-6)
+        synth.mix_into(bar, get_kick(), position_ms=int(beat_ms * 2.5), gain_db=-8)
+        synth.mix_into(bar, get_snare(), position_ms=beat_ms * 3, gain_db=-6)
 
     # 4. Global Effects
     if genre == "lofi":
-        bar = bar.low_pass_filter(1500)
+        bar = synth.low_pass(bar, 1500)
     elif genre == "bollywood":
-         bar = bar.high_pass_filter(200) # Crisp
+         bar = synth.high_pass(bar, 200) # Crisp
          
-    # 5. Assemble and Loop
-    music = AudioSegment.silent(duration=0)
-    while len(music) < duration_ms:
-        music += bar
-        
-    music = music[:duration_ms]
-    
     # Final normalization/leveling
-    music = music + 2 # Boost slightly
-    music = music.fade_in(2000).fade_out(3000)
+    return bar * synth.db_to_gain(2) # Boost slightly
+
+
+def _get_bar_loop(genre: str) -> np.ndarray:
+    """Return the cached bar loop for a genre, rendering it on first use."""
+    # Every unknown genre renders the same default loop, so they share one entry
+    key = genre if genre in SONG_STRUCTURES else ""
+    bar = _BAR_LOOP_CACHE.get(key)
+    if bar is None:
+        bar = _render_bar_loop(key)
+        bar.setflags(write=False)
+        _BAR_LOOP_CACHE[key] = bar
+    return bar
+
+
+def warm_bar_loop_cache():
+    """Pre-render the loops for every genre in SONG_STRUCTURES and the default (a render-pool warm-up)."""
+    for genre in list(SONG_STRUCTURES) + [""]:
+        _get_bar_loop(genre)
+
+
+render_pool.register_warmup(warm_bar_loop_cache)
+
+
+def get_bar_loop_cache_stats():
+    """Memory footprint of the rendered loop cache in the calling process."""
+    return {
+        "pid": os.getpid(),
+        "genres": sorted(_BAR_LOOP_CACHE.keys()),
+        "entries": len(_BAR_LOOP_CACHE),
+        "bytes": sum(bar.nbytes for bar in _BAR_LOOP_CACHE.values()),
+    }
+
+
+def _background_block(bar: np.ndarray, start: int, frames: int, total: int) -> np.ndarray:
+    """
+    Samples [start, start + frames) of the backing track: the cached bar loop tiled
+    to `total` samples with a 2 s fade-in and 3 s fade-out. No synthesis per request.
+    """
+    index = np.arange(start, start + frames)
+    block = bar[index % len(bar)]
+    fade_in = synth.sample_count(2000)
+    fade_out = min(synth.sample_count(3000), total)
+    gain = np.ones(frames, dtype=np.float32)
+    if start < fade_in:
+        gain = np.minimum(gain, index / fade_in)
+    if start + frames > total - fade_out:
+        gain = np.minimum(gain, np.clip((total - index) / fade_out, 0.0, 1.0))
+    return block * gain
+
+
+def _render_song(section_audio: list, genre: str, final_filepath: str, vocal_filepath: str = None) -> str:
+    """
+    Lay the vocal sections out over the backing track and encode the mix in a
+    single streaming pass; nothing is materialized as a full-length track.
+    The vocal stem is written from the same pass only if vocal_filepath is given.
+    Runs in the render pool; returns final_filepath.
+    """
+    # Timeline: a small initial silence, then each section followed by a natural pause
+    placements = []
+    cursor = synth.sample_count(1)
+    for sec_audio in section_audio:
+        samples = to_array(sec_audio)
+        placements.append((cursor, samples))
+        cursor += len(samples) + synth.sample_count(random.randint(300, 600))
+    total = cursor
+
+    try:
+        bar = _get_bar_loop(genre)
+    except Exception as mix_e:
+        print(f"Mixing failed: {mix_e}")
+        bar = np.zeros(1, dtype=np.float32)
+
+    outputs = [{"path": final_filepath, "channels": (0, 1)}]
+    if vocal_filepath:
+        outputs.append({"path": vocal_filepath, "channels": (2, 3)})
+
+    # Mix in the first two channels, the dry vocal stem in the other two
+    with Mp3Encoder(outputs, channels=2 * len(outputs), frame_rate=synth.SAMPLE_RATE) as encoder:
+        for start in range(0, total, RENDER_BLOCK_FRAMES):
+            frames = min(RENDER_BLOCK_FRAMES, total - start)
+            vocals = np.zeros((frames, 2), dtype=np.float32)
+            for position, samples in placements:
+                lo, hi = max(start, position), min(start + frames, position + len(samples))
+                if lo < hi:
+                    vocals[lo - start:hi - start] += samples[lo - position:hi - position]
+            mix = vocals + _background_block(bar, start, frames, total)[:, None]
+            encoder.write(np.hstack([mix, vocals]) if vocal_filepath else mix)
+    return final_filepath
+
+
+async def _synthesize_section(i: int, total: int, section: dict, base_voice: str, semaphore: asyncio.Semaphore):
+    """
+    Synthesize one lyric section with its emotional preset.
+    Returns the processed AudioSegment, or None if the section failed.
+    """
+    section_text = " ... ".join([f"♪ {l} ♪" for l in section["lines"]])
+    preset = EMOTIONAL_PRESETS.get(section["type"], EMOTIONAL_PRESETS["default"])
     
-    return music
+    try:
+        # Add slight micro-randomization for more "human" feel
+        pitch_val = int(preset['pitch'].replace('Hz',''))
+        pitch_variance = random.randint(-2, 2)
+        final_pitch = f"{pitch_val + pitch_variance:+d}Hz"
+        
+        async with semaphore:
+            print(f"DEBUG: Synthesizing section {i+1}/{total} (Type: {section['type']})")
+            # Stream the section straight into memory and decode it for mixing
+            sec_audio = await tts_service.synthesize_segment(
+                section_text,
+                base_voice,
+                rate=preset.get("rate", "-10%"),
+                pitch=final_pitch
+            )
+        if sec_audio is None:
+            print(f"DEBUG: Section {i+1} synthesis produced no audio.")
+            return None
+        
+        # Apply volume drift for emotion
+        sec_audio = sec_audio + preset.get("volume", 0)
+        
+        # If chorus, add subtle doubling for richness
+        if section["type"] in ["chorus", "final"]:
+            # Double vocals: shifted slightly in time and lower volume
+            doubled = sec_audio.overlay(sec_audio - 10, position=30)
+            sec_audio = doubled
+        
+        return sec_audio
+    except Exception as e:
+        print(f"Section synthesis failed for section {i}: {e}")
+        return None
 
 
-async def generate_song(prompt: str, genre: str = "", duration: int = 10, language: str = "en"):
+async def generate_song(prompt: str, genre: str = "", duration: int = 10, language: str = "en", vocal_stem: bool = False, progress=None):
     """
     Generate a song with emotional sectional vocals and background music.
+    vocal_stem: also return the unmixed vocal track (encoded in the same pass).
+    progress: optional callback(stage, fraction) used by background render jobs.
     """
     # Step 1: Generate lyrics
+    if progress:
+        progress("lyrics", 0.05)
     lyrics = _generate_lyrics(prompt, genre, language)
     final_lyrics = lyrics
+    sections = None
     
     # Step 2: Translate if needed
     if language != "en":
+        if progress:
+            progress("translating", 0.1)
         try:
-            # Map 'zh' to 'zh-CN' for deep-translator compatibility
-            trans_lang = "zh-CN" if language == "zh" else language
-            translator = GoogleTranslator(source='auto', target=trans_lang)
-            final_lyrics = translator.translate(lyrics)
+            final_lyrics, sections = await _translate_lyrics(lyrics, language)
         except Exception as e:
             print(f"Lyrics translation failed: {e}")
             final_lyrics = lyrics
             language = "en"
     
     # Step 3: Parse and Synthesize Sections Emotionally
-    sections = _parse_lyrics_into_sections(final_lyrics)
+    if sections is None:
+        sections = _parse_lyrics_into_sections(final_lyrics)
     
     # Pick base voice
     if language != "en" and language in LANGUAGE_VOICES:
@@ -481,77 +636,37 @@ async def generate_song(prompt: str, genre: str = "", duration: int = 10, langua
         voice_key = random.choice(voice_options)
         base_voice = SINGING_VOICES[voice_key]["voice"]
 
-    full_vocals = AudioSegment.silent(duration=1) # Small initial silent segment
-    
-    # Step 4: Sectional Emotional Synthesis
+    # Step 4: Sectional Emotional Synthesis (sections render concurrently, assembly stays in lyric order)
     print(f"DEBUG: Starting song synthesis for {len(sections)} sections...")
-    for i, section in enumerate(sections):
-        section_text = " ... ".join([f"♪ {l} ♪" for l in section["lines"]])
-        preset = EMOTIONAL_PRESETS.get(section["type"], EMOTIONAL_PRESETS["default"])
-        
-        # Temporary file for this section
-        sec_filename = f"sec_{uuid.uuid4().hex[:8]}.mp3"
-        sec_filepath = os.path.join(OUTPUT_DIR, sec_filename)
-        
-        try:
-            # Add slight micro-randomization for more "human" feel
-            pitch_val = int(preset['pitch'].replace('Hz',''))
-            pitch_variance = random.randint(-2, 2)
-            final_pitch = f"{pitch_val + pitch_variance}Hz"
-            
-            print(f"DEBUG: Synthesizing section {i+1}/{len(sections)} (Type: {section['type']})")
-            communicate = edge_tts.Communicate(
-                section_text,
-                base_voice,
-                rate=preset.get("rate", "-10%"),
-                pitch=final_pitch
-            )
-            await communicate.save(sec_filepath)
-            
-            if not os.path.exists(sec_filepath) or os.path.getsize(sec_filepath) == 0:
-                print(f"DEBUG: Section {i+1} synthesis produced empty file.")
-                continue
-
-            # Load and process section using workaround
-            sec_audio = _load_audio_workaround(sec_filepath)
-            if sec_audio is None:
-                print(f"DEBUG: Could not load section {i+1} audio.")
-                continue
-            
-            # Apply volume drift for emotion
-            sec_audio = sec_audio + preset.get("volume", 0)
-            
-            # If chorus, add subtle doubling for richness
-            if section["type"] in ["chorus", "final"]:
-                # Double vocals: shifted slightly in time and lower volume
-                doubled = sec_audio.overlay(sec_audio - 10, position=30)
-                sec_audio = doubled
-            
-            # Add to full track with a natural pause
-            pause_ms = random.randint(300, 600)
-            full_vocals += sec_audio + AudioSegment.silent(duration=pause_ms)
-            
-            # Clean up temp section file
-            try:
-                os.remove(sec_filepath)
-            except:
-                pass
-        except Exception as e:
-            print(f"Section synthesis failed for section {i}: {e}")
-            continue
+    semaphore = asyncio.Semaphore(max(1, SECTION_SYNTH_CONCURRENCY))
+    completed = 0
+
+    async def synthesize_tracked(i, section):
+        nonlocal completed
+        sec_audio = await _synthesize_section(i, len(sections), section, base_voice, semaphore)
+        completed += 1
+        if progress:
+            progress("synthesizing", 0.15 + 0.6 * completed / len(sections))
+        return sec_audio
+
+    if progress:
+        progress("synthesizing", 0.15)
+    rendered = await asyncio.gather(*[
+        synthesize_tracked(i, section) for i, section in enumerate(sections)
+    ])
+    
+    section_audio = [sec_audio for sec_audio in rendered if sec_audio is not None]
 
-    if len(full_vocals) < 100: # Less than 100ms means it's basically empty
+    if not section_audio: # No section produced audio
         print("DEBUG: Sectional synthesis failed completely. Attempting fallback...")
         try:
             # Fallback to simple synthesis
-            full_text = _format_lyrics_for_singing(final_lyrics)
-            fallback_filename = f"vocal_fb_{uuid.uuid4().hex[:8]}.mp3"
-            fallback_path = os.path.join(OUTPUT_DIR, fallback_filename)
-            communicate = edge_tts.Communicate(full_text, base_voice)
-            await communicate.save(fallback_path)
+            # Built from the sections: translated labels would not be recognised and stripped
+            full_text = _format_lyrics_for_singing("\n".join(l for section in sections for l in section["lines"]))
+            fallback_filename = await tts_service.synthesize_to_file(full_text, base_voice, prefix="vocal_fb")
             return {
                 "filename": fallback_filename,
-                "url": f"/static/audio/{fallback_filename}",
+                "url": artifact_store.url_for(fallback_filename),
                 "prompt": prompt,
                 "genre": genre,
                 "lyrics": final_lyrics,
@@ -563,27 +678,23 @@ async def generate_song(prompt: str, genre: str = "", duration: int = 10, langua
             print(f"Fallback synthesis also failed: {fb_e}")
             return {"status": "error", "error": f"Synthesis failed: {str(fb_e)}"}
 
-    # Export final vocals
-    vocal_filename = f"vocal_{uuid.uuid4().hex[:8]}.mp3"
-    vocal_filepath = os.path.join(OUTPUT_DIR, vocal_filename)
-    full_vocals.export(vocal_filepath, format="mp3")
-    
-    # Step 5: Mix with Background Music
-    try:
-        bg_music = _generate_background_music(genre, len(full_vocals))
-        # Mix vocals over music (music slightly lower)
-        combined = bg_music.overlay(full_vocals)
-        
-        final_filename = f"song_full_{uuid.uuid4().hex[:8]}.mp3"
-        final_filepath = os.path.join(OUTPUT_DIR, final_filename)
-        combined.export(final_filepath, format="mp3")
-    except Exception as mix_e:
-        print(f"Mixing failed: {mix_e}")
-        final_filename = vocal_filename
+    # Step 5: Assemble vocals and mix with background music in the render pool
+    if progress:
+        progress("mixing", 0.8)
+    # The dry vocal stem is only encoded when asked for
+    final_filename = f"song_full_{uuid.uuid4().hex[:8]}.mp3"
+    vocal_filename = f"vocal_{uuid.uuid4().hex[:8]}.mp3" if vocal_stem else None
+    await render_pool.run_render(
+        _render_song, section_audio, genre, artifact_store.path_for(final_filename),
+        artifact_store.path_for(vocal_filename) if vocal_filename else None
+    )
+    url = await artifact_store.publish(final_filename, "song")
+    vocal_url = await artifact_store.publish(vocal_filename, "song") if vocal_filename else None
     
     return {
         "filename": final_filename,
-        "url": f"/static/audio/{final_filename}",
+        "url": url,
+        "vocal_url": vocal_url,
         "prompt": prompt,
         "genre": genre,
         "lyrics": final_lyrics,
@@ -593,24 +704,23 @@ async def generate_song(prompt: str, genre: str = "", duration: int = 10, langua
     }
 
 
-async def generate_lyrics_with_translation(prompt: str, genre: str = "", duration: int = 10, language: str = "en", target_lang: str = None):
+async def generate_lyrics_with_translation(prompt: str, genre: str = "", duration: int = 10, language: str = "en", target_lang: str = None, vocal_stem: bool = False, progress=None):
     """
     Generate lyrics and potentially translate them at the same time.
     Returns both original and translated lyrics.
     """
     # 1. Generate core response
-    result = await generate_song(prompt, genre, duration, language)
+    result = await generate_song(prompt, genre, duration, language, vocal_stem=vocal_stem, progress=progress)
     
     if result["status"] == "error":
         return result
     
     # 2. Add translation if requested
     if target_lang and target_lang != language:
+        if progress:
+            progress("translating lyrics", 0.95)
         try:
-            # Map 'zh' to 'zh-CN' for deep-translator compatibility
-            trans_lang = "zh-CN" if target_lang == "zh" else target_lang
-            translator = GoogleTranslator(source='auto', target=trans_lang)
-            translated_lyrics = translator.translate(result["lyrics"])
+            translated_lyrics, _ = await _translate_lyrics(result["lyrics"], target_lang)
             result["translated_lyrics"] = translated_lyrics
             result["target_language"] = target_lang
         except Exception as e:
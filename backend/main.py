@@ -1,20 +1,28 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, Response
+from pydantic import BaseModel, EmailStr, ValidationError, Field
 from typing import Optional, List
 from sqlalchemy.orm import Session
 import tts_service
+import tts_cache
+import voice_catalog
 import lyrics_service
 import translate_service
 import clone_service
+import render_pool
+import audio_utils
+import job_service
+import artifact_store
 import database, models
 from passlib.context import CryptContext
 
 import os
-import uuid
+import json
 import shutil
+import asyncio
+import tempfile
 
 import logging
 import traceback
@@ -48,13 +56,65 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Audio-Url"],
 )
 
+# Reject oversized uploads from their Content-Length before the body is parsed
+UPLOAD_ENDPOINTS = {"/translate-audio", "/studio-process", "/audio-mashup", "/analyze-mood"}
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.method == "POST" and request.url.path in UPLOAD_ENDPOINTS:
+        content_length = request.headers.get("content-length")
+        # Two files may be uploaded to /audio-mashup
+        limit = audio_utils.MAX_UPLOAD_BYTES * (2 if request.url.path == "/audio-mashup" else 1)
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            return JSONResponse(status_code=413, content={"detail": "Upload is larger than the allowed limit."})
+    return await call_next(request)
+
+@app.middleware("http")
+async def track_artifact_access(request: Request, call_next):
+    response = await call_next(request)
+    # Downloads keep an artifact alive; the sweeper evicts by last access
+    if request.method == "GET" and request.url.path.startswith(artifact_store.URL_PREFIX + "/") and response.status_code < 400:
+        artifact_store.touch(request.url.path)
+    return response
+
 # Serve static files for audio
 os.makedirs("static/audio", exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
+@app.on_event("startup")
+async def warm_voice_catalog():
+    voice_catalog.warm()
+
+
+@app.on_event("startup")
+async def start_job_workers():
+    job_service.start_workers()
+
+
+@app.on_event("startup")
+async def start_artifact_sweeper():
+    artifact_store.start_sweeper()
+
+
+@app.on_event("shutdown")
+async def stop_artifact_sweeper():
+    await artifact_store.stop_sweeper()
+
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_service.stop_workers()
+
+
+@app.on_event("shutdown")
+def shutdown_render_pool():
+    render_pool.shutdown()
+
+
 # ============================================================
 # Request Models
 # ============================================================
@@ -79,6 +139,8 @@ class UserResponse(BaseModel):
 class TTSRequest(BaseModel):
     text: str
     voice: str
+    stream: bool = False  # stream MP3 chunks as they are synthesized
+    save: bool = True  # streaming mode: also keep the audio under /static/audio
 
 
 class LyricsRequest(BaseModel):
@@ -87,12 +149,14 @@ class LyricsRequest(BaseModel):
     duration: int = 10
     language: str = "en"
     target_lang: Optional[str] = None
+    vocal_stem: bool = False  # also return the unmixed vocal track
 
 
 class TranslateTextRequest(BaseModel):
     text: str
     target_lang: str
     source_lang: str = "auto"
+    stream: bool = False  # /translate-to-all: NDJSON, one line per language as it finishes
 
 
 class CloneRequest(BaseModel):
@@ -160,25 +224,44 @@ def login(request: LoginRequest, db: Session = Depends(database.get_db)):
 # ============================================================
 
 @app.get("/voices")
-async def get_voices():
+async def get_voices(request: Request, locale: Optional[str] = None, gender: Optional[str] = None, language: Optional[str] = None):
+    """Voice catalog, optionally filtered (e.g. ?language=en,hi&gender=female). Served from cache."""
     try:
-        voices = await tts_service.get_voices()
-        return [
-            {
-                "ShortName": v["ShortName"],
-                "FriendlyName": v["FriendlyName"],
-                "Gender": v["Gender"],
-                "Locale": v["Locale"],
-                "SuggestedCodec": v["SuggestedCodec"]
-            }
-            for v in voices
-        ]
+        encoded = await voice_catalog.get_response(locale, gender, language)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    headers = {"ETag": encoded["etag"], "Cache-Control": "public, max-age=300", "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or encoded["etag"] in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    if encoded["gzip"] and "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(encoded["gzip"], media_type="application/json", headers={**headers, "Content-Encoding": "gzip"})
+    return Response(encoded["body"], media_type="application/json", headers=headers)
+
+
+@app.get("/tts-cache/stats")
+async def get_tts_cache_stats():
+    return tts_cache.get_stats()
+
+
+@app.get("/artifacts/stats")
+async def get_artifact_stats():
+    return await asyncio.to_thread(artifact_store.get_stats)
+
+
+@app.get("/bar-loops/stats")
+async def get_bar_loop_stats():
+    # The loops are cached in the render processes (each warms all of them at start),
+    # so one of them reports the footprint, which every render process carries
+    stats = await render_pool.run_render(lyrics_service.get_bar_loop_cache_stats)
+    processes = max(1, render_pool.RENDER_WORKERS)
+    return {**stats, "processes": processes, "total_bytes": stats["bytes"] * processes}
 
 @app.post("/synthesize")
 async def synthesize(request: TTSRequest):
+    if request.stream:
+        return await _stream_synthesis(request)
     try:
         result = await tts_service.synthesize_speech(request.text, request.voice)
         return result
@@ -186,6 +269,65 @@ async def synthesize(request: TTSRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Saved streams whose client may already be gone; referenced so the tasks aren't garbage collected
+_detached_streams = set()
+
+
+def _detach(chunks):
+    """
+    Drive `chunks` to completion in a background task and yield what it produces.
+    The task keeps going if the client disconnects, so a saved stream is still written.
+    """
+    queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for chunk in chunks:
+                queue.put_nowait(chunk)
+            queue.put_nowait(None)
+        except Exception as e:
+            print(f"Streaming synthesis failed: {e}")
+            queue.put_nowait(e)
+
+    task = asyncio.create_task(pump())
+    _detached_streams.add(task)
+    task.add_done_callback(_detached_streams.discard)
+
+    async def relay():
+        while (item := await queue.get()) is not None:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    return relay()
+
+
+async def _stream_synthesis(request: TTSRequest):
+    filename = tts_service.speech_filename(request.text, request.voice) if request.save else None
+    chunks = tts_service.stream_speech(request.text, request.voice, save_as=filename)
+    
+    # Wait for the first chunk so provider errors still surface as a 500
+    try:
+        first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=500, detail="No audio was received from the TTS service.")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    headers = {}
+    if filename:
+        # The file is published once synthesis completes (even if the client disconnects
+        # first); until then X-Audio-Url returns 404
+        chunks = _detach(chunks)
+        headers["X-Audio-Url"] = artifact_store.url_for(filename)
+    
+    async def body():
+        yield first_chunk
+        async for chunk in chunks:
+            yield chunk
+    
+    return StreamingResponse(body(), media_type="audio/mpeg", headers=headers)
+
+
 # ============================================================
 # Lyrics Generation (formerly Song Generation)
 # ============================================================
@@ -208,7 +350,8 @@ async def generate_lyrics(request: LyricsRequest):
             genre=request.genre,
             duration=request.duration,
             language=request.language,
-            target_lang=request.target_lang
+            target_lang=request.target_lang,
+            vocal_stem=request.vocal_stem
         )
         return result
     except Exception as e:
@@ -230,26 +373,16 @@ async def translate_audio(
     target_lang: str = Form(...),
     source_lang: str = Form("auto")
 ):
-    temp_dir = "static/temp"
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_path = os.path.join(temp_dir, f"upload_{uuid.uuid4().hex[:8]}_{audio.filename}")
-
     try:
-        with open(temp_path, "wb") as f:
-            content = await audio.read()
-            f.write(content)
-
-        result = await translate_service.translate_audio(temp_path, target_lang, source_lang)
+        # The upload is streamed straight into the decoder; nothing is copied to a temp file
+        audio_utils.check_upload_size(audio.size)
+        result = await translate_service.translate_audio(audio.file, target_lang, source_lang)
         return result
 
+    except audio_utils.AudioLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except:
-                pass
 
 
 @app.post("/translate-text")
@@ -281,12 +414,32 @@ import clone_service
 # ============================================================
 
 @app.post("/translate-to-all")
-async def translate_to_all(request: TranslateTextRequest):
+async def translate_to_all(request: TranslateTextRequest, http_request: Request):
+    # Progressive results: SSE if the client asks for an event stream, NDJSON with "stream": true
+    if "text/event-stream" in http_request.headers.get("accept", ""):
+        return _stream_translate_to_all(request, sse=True)
+    if request.stream:
+        return _stream_translate_to_all(request, sse=False)
     try:
-        return await translate_service.translate_to_all_languages(request.text)
+        return await translate_service.translate_to_all_languages(request.text, request.source_lang)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+def _stream_translate_to_all(request: TranslateTextRequest, sse: bool):
+    async def body():
+        count = 0
+        async for result in translate_service.stream_translate_to_all(request.text, request.source_lang):
+            count += 1
+            line = json.dumps(result, ensure_ascii=False)
+            yield f"event: result\ndata: {line}\n\n" if sse else line + "\n"
+        done = json.dumps({"status": "success", "original_text": request.text, "mode": "all", "count": count, "done": True}, ensure_ascii=False)
+        yield f"event: done\ndata: {done}\n\n" if sse else done + "\n"
+
+    if sse:
+        return StreamingResponse(body(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
 # ============================================================
 # Voice Cloning Endpoints
 # ============================================================
@@ -317,7 +470,7 @@ class PodcastRequest(BaseModel):
 
 class MusicRequest(BaseModel):
     instrument: str
-    duration: int = 10
+    duration: int = Field(10, ge=1, le=music_service.MAX_MUSIC_SECONDS)
 
 class AnalyzeRequest(BaseModel):
     text: Optional[str] = None
@@ -369,18 +522,21 @@ async def get_instruments():
 @app.post("/studio-process")
 async def studio_process(
     audio: UploadFile = File(...),
-    effect: str = Form(...)
+    effect: Optional[str] = Form(None),
+    effects: Optional[str] = Form(None)
 ):
-    temp_path = f"temp_{uuid.uuid4().hex[:8]}_{audio.filename}"
+    # `effects` is an ordered chain (JSON list or comma-separated names); `effect` is a single name
+    try:
+        chain = studio_service.parse_effects(effects if effects is not None else effect)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     try:
-        with open(temp_path, "wb") as f:
-            f.write(await audio.read())
-        return await studio_service.process_audio(temp_path, effect)
+        audio_utils.check_upload_size(audio.size)
+        return await studio_service.process_audio(audio.file, chain)
+    except audio_utils.AudioLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
 
 @app.post("/audio-mashup")
 async def audio_mashup(
@@ -389,17 +545,14 @@ async def audio_mashup(
     style: str = Form("smooth"),
     balance: float = Form(0.5)
 ):
-    path1 = f"temp1_{uuid.uuid4().hex[:8]}.mp3"
-    path2 = f"temp2_{uuid.uuid4().hex[:8]}.mp3"
     try:
-        with open(path1, "wb") as f1: f1.write(await audio1.read())
-        with open(path2, "wb") as f2: f2.write(await audio2.read())
-        return await studio_service.create_mashup(path1, path2, style, balance)
+        audio_utils.check_upload_size(audio1.size)
+        audio_utils.check_upload_size(audio2.size)
+        return await studio_service.create_mashup(audio1.file, audio2.file, style, balance)
+    except audio_utils.AudioLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        for p in [path1, path2]:
-            if os.path.exists(p): os.remove(p)
 
 @app.post("/analyze-mood")
 async def analyze_mood(
@@ -408,30 +561,140 @@ async def analyze_mood(
 ):
     try:
         if audio:
-            # Generate a proper extension based on original filename if possible
-            ext = os.path.splitext(audio.filename)[1] or ".mp3"
-            temp_path = f"temp_mood_{uuid.uuid4().hex[:8]}{ext}"
-            with open(temp_path, "wb") as f:
-                f.write(await audio.read())
-            try:
-                res = await analysis_service.analyze_audio_mood(temp_path)
-                return res
-            finally:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+            # ffmpeg probes the format itself, so the upload is decoded in place
+            audio_utils.check_upload_size(audio.size)
+            res = await analysis_service.analyze_audio_mood(audio.file)
+            return res
         elif text:
             # Return full percentage breakdown
             mood_result = analysis_service.analyze_text_mood(text)
             return {"status": "success", "mood": mood_result}
         else:
             raise HTTPException(status_code=400, detail="Either text or audio is required")
+    except HTTPException:
+        raise
+    except audio_utils.AudioLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/analyze-mood/bulk")
+async def analyze_mood_bulk(request: Request, format: str = "auto"):
+    """
+    Score many texts in one request. The body is NDJSON / plain text with one text per line,
+    or a multipart upload with the corpus in a "file" field; either is spooled to disk. Per-text results stream back as
+    NDJSON, followed by a summary line with the aggregate mood distributions.
+    """
+    if format not in analysis_service.BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(analysis_service.BULK_FORMATS)}")
+
+    form = None
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if not hasattr(upload, "read"):
+            await form.close()
+            raise HTTPException(status_code=400, detail="A file upload named 'file' is required")
+    else:
+        # The body is spooled (to disk past 1 MB) before responding: while a StreamingResponse
+        # runs, Starlette reads receive() itself to watch for disconnects
+        upload = UploadFile(file=tempfile.SpooledTemporaryFile(max_size=1024 * 1024))
+        async for chunk in request.stream():
+            await upload.write(chunk)
+        await upload.seek(0)
+
+    async def chunks():
+        while chunk := await upload.read(64 * 1024):
+            yield chunk
+
+    async def body():
+        try:
+            async for result in analysis_service.analyze_text_mood_bulk(chunks(), format):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        except Exception as e:
+            # Headers are already sent; report the failure in-band
+            yield json.dumps({"status": "error", "done": True, "error": str(e)}) + "\n"
+        finally:
+            await (form.close() if form is not None else upload.close())
+
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
 
 
-# ... (inside routes)
+# ============================================================
+# Background Render Jobs
+# ============================================================
 
+# Request body accepted for each job kind (same as the synchronous endpoint)
+JOB_REQUEST_MODELS = {
+    "song": LyricsRequest,
+    "podcast": PodcastRequest,
+    "story": StoryRequest,
+    "music": MusicRequest,
+}
+
+@app.post("/jobs/{kind}", status_code=202)
+async def submit_job(kind: str, request: Request):
+    """Queue a song/podcast/story/music render and return its job id immediately."""
+    model = JOB_REQUEST_MODELS.get(kind)
+    if model is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job kind: {kind}")
+    try:
+        params = model(**(await request.json())).model_dump()
+    except (ValueError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    job = await asyncio.to_thread(job_service.submit_job, kind, params)
+    job["status_url"] = f"/jobs/{job['job_id']}"
+    job["events_url"] = f"/jobs/{job['job_id']}/events"
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_service.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = await asyncio.to_thread(job_service.cancel_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events with the job record on every stage/progress change until it finishes."""
+    if await asyncio.to_thread(job_service.get_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        last, idle = None, 0
+        while True:
+            job = await asyncio.to_thread(job_service.get_job, job_id)
+            if job is None:
+                yield "event: gone\ndata: {}\n\n"
+                return
+            snapshot = (job["status"], job["stage"], job["progress"])
+            if snapshot != last:
+                last, idle = snapshot, 0
+                yield f"event: {job['status']}\ndata: {json.dumps(job)}\n\n"
+            else:
+                idle += 1
+                if idle * job_service.JOB_POLL_SECONDS >= 15:
+                    # Comment line keeps proxies from closing a quiet stream
+                    idle = 0
+                    yield ": keep-alive\n\n"
+            if job["status"] in job_service.TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(job_service.JOB_POLL_SECONDS)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 # ============================================================
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime
 from database import Base
 
 class User(Base):
@@ -8,3 +8,36 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
+
+
+class RenderJob(Base):
+    """A queued background render. The table itself is the queue shared by all job workers."""
+    __tablename__ = "render_jobs"
+
+    id = Column(String, primary_key=True, index=True)
+    kind = Column(String, index=True)
+    params = Column(Text)  # JSON request body
+    status = Column(String, index=True, default="queued")  # queued, running, succeeded, failed, cancelled
+    stage = Column(String, default="queued")
+    progress = Column(Float, default=0.0)
+    result = Column(Text, nullable=True)  # JSON service response
+    error = Column(Text, nullable=True)
+    cancel_requested = Column(Boolean, default=False)
+    attempts = Column(Integer, default=0)
+    worker_id = Column(String, nullable=True)
+    created_at = Column(DateTime, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+
+class Artifact(Base):
+    """A generated audio file under static/audio, tracked for TTL and quota eviction."""
+    __tablename__ = "artifacts"
+
+    filename = Column(String, primary_key=True, index=True)
+    path = Column(String)  # relative to the artifact root, e.g. "3f/a9/song_full_1234abcd.mp3"
+    endpoint = Column(String, index=True)  # what created it (tts, song, podcast, studio...)
+    size = Column(Integer, default=0)
+    created_at = Column(DateTime)
+    last_access = Column(DateTime, index=True)
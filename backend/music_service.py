@@ -1,9 +1,13 @@
 import os
 import uuid
-import asyncio
 from pydub import AudioSegment
-from pydub.generators import Sine, Square, Sawtooth, Triangle
 import random
+import functools
+import numpy as np
+import render_pool
+import artifact_store
+import synth
+from audio_utils import from_array, Mp3Encoder
 
 # Configure pydub to use imageio-ffmpeg bundled binary
 try:
@@ -15,14 +19,17 @@ try:
 except ImportError:
     pass
 
-OUTPUT_DIR = "static/audio"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Longest melody a single request may render, in seconds
+MAX_MUSIC_SECONDS = int(os.getenv("MAX_MUSIC_SECONDS", "300"))
+
+# Frames handed to the encoder at a time when rendering a melody
+RENDER_BLOCK_FRAMES = 44100
 
 INSTRUMENTS = {
-    "piano": {"generator": Sine, "vol": -10, "decay": 100},
-    "guitar": {"generator": Triangle, "vol": -12, "decay": 150},
-    "synth": {"generator": Sawtooth, "vol": -15, "decay": 50},
-    "flute": {"generator": Sine, "vol": -8, "decay": 200}
+    "piano": {"generator": synth.sine, "vol": -10, "decay": 100},
+    "guitar": {"generator": synth.triangle, "vol": -12, "decay": 150},
+    "synth": {"generator": synth.sawtooth, "vol": -15, "decay": 50},
+    "flute": {"generator": synth.sine, "vol": -8, "decay": 200}
 }
 
 NOTES = {
@@ -33,15 +40,65 @@ NOTES = {
     "C6": 1046.50, "D6": 1174.66, "E6": 1318.51
 }
 
-def generate_note(freq, duration_ms, instrument="piano"):
+@functools.lru_cache(maxsize=512)
+def _note_waveform(freq: float, duration_ms: int, instrument: str) -> np.ndarray:
+    """Rendered (read-only) samples for one note, cached per (instrument, frequency, duration)."""
     inst = INSTRUMENTS.get(instrument, INSTRUMENTS["piano"])
-    gen = inst["generator"](freq)
-    audio = gen.to_audio_segment(duration=duration_ms, volume=inst["vol"])
-    return audio.fade_out(inst["decay"])
+    wave = synth.fade_out(inst["generator"](freq, duration_ms, volume=inst["vol"]), inst["decay"])
+    wave.setflags(write=False)
+    return wave
 
-async def generate_music(instrument: str, duration: int = 10, scale: str = "major"):
+def generate_note(freq, duration_ms, instrument="piano"):
+    return from_array(_note_waveform(freq, duration_ms, instrument), synth.SAMPLE_RATE)
+
+def _plan_melody(pattern: dict, target_ms: int) -> list:
+    """Pick the whole note sequence up front as (frequency, duration_ms) pairs."""
+    plan = []
+    current_ms = 0
+    
+    while current_ms < target_ms:
+        note_name = random.choice(pattern["notes"])
+        # If note_name not in NOTES, fallback to C4
+        freq = NOTES.get(note_name, 261.63)
+        
+        note_duration = random.choice(pattern["rhythm"])
+        # Ensure we don't overshoot duration too much
+        if current_ms + note_duration > target_ms:
+            note_duration = target_ms - current_ms
+            
+        plan.append((freq, note_duration))
+        current_ms += note_duration
+    
+    return plan
+
+def _render_melody(pattern: dict, instrument: str, target_ms: int, filepath: str) -> str:
+    """
+    Render a random melody from the pattern and export it to MP3. Runs in the render pool.
+    Notes are copied into a fixed-size block that is encoded whenever it fills, so memory
+    doesn't grow with duration.
+    """
+    block = np.zeros(RENDER_BLOCK_FRAMES, dtype=np.float32)
+    filled = 0
+    with Mp3Encoder([{"path": filepath}], channels=1, frame_rate=synth.SAMPLE_RATE) as encoder:
+        for freq, note_duration in _plan_melody(pattern, target_ms):
+            wave = _note_waveform(freq, note_duration, instrument)
+            offset = 0
+            while offset < len(wave):
+                count = min(len(wave) - offset, RENDER_BLOCK_FRAMES - filled)
+                block[filled:filled + count] = wave[offset:offset + count]
+                filled += count
+                offset += count
+                if filled == RENDER_BLOCK_FRAMES:
+                    encoder.write(block)
+                    filled = 0
+        if filled:
+            encoder.write(block[:filled])
+    return filepath
+
+async def generate_music(instrument: str, duration: int = 10, scale: str = "major", progress=None):
     """
     Generate procedural music melody based on instrument and scale with distinct patterns.
+    progress: optional callback(stage, fraction) used by background render jobs.
     """
     # Define instrument-specific patterns
     patterns = {
@@ -68,36 +125,23 @@ async def generate_music(instrument: str, duration: int = 10, scale: str = "majo
     }
     
     pattern = patterns.get(instrument, patterns["piano"])
-    combined_audio = AudioSegment.silent(duration=0)
-    
-    current_ms = 0
-    target_ms = duration * 1000
+    if not 1 <= duration <= MAX_MUSIC_SECONDS:
+        return {"status": "error", "error": f"Duration must be between 1 and {MAX_MUSIC_SECONDS} seconds"}
     
     try:
-        while current_ms < target_ms:
-            note_name = random.choice(pattern["notes"])
-            # If note_name not in NOTES, fallback to C4
-            freq = NOTES.get(note_name, 261.63)
-            
-            note_duration = random.choice(pattern["rhythm"])
-            # Ensure we don't overshoot duration too much
-            if current_ms + note_duration > target_ms:
-                note_duration = target_ms - current_ms
-                
-            part = generate_note(freq, note_duration, instrument)
-            combined_audio += part
-            current_ms += note_duration
-            
         final_filename = f"music_{uuid.uuid4().hex[:8]}.mp3"
-        final_filepath = os.path.join(OUTPUT_DIR, final_filename)
-        combined_audio.export(final_filepath, format="mp3")
+        final_filepath = artifact_store.path_for(final_filename)
+        if progress:
+            progress("rendering", 0.1)
+        await render_pool.run_render(_render_melody, pattern, instrument, duration * 1000, final_filepath)
+        url = await artifact_store.publish(final_filename, "music")
         
         return {
             "status": "success",
             "instrument": instrument,
             "duration": duration,
             "filename": final_filename,
-            "url": f"/static/audio/{final_filename}"
+            "url": url
         }
     except Exception as e:
         error_msg = str(e)
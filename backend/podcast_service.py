@@ -1,9 +1,12 @@
 import os
 import uuid
 import asyncio
-import edge_tts
 from pydub import AudioSegment
 import random
+import tts_service
+import render_pool
+from audio_utils import Mp3Encoder
+import artifact_store
 
 # Configure pydub to use imageio-ffmpeg bundled binary
 try:
@@ -15,43 +18,25 @@ try:
 except ImportError:
     pass
 
-OUTPUT_DIR = "static/audio"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Maximum number of podcast turns synthesized at the same time
+PODCAST_SYNTH_CONCURRENCY = int(os.getenv("PODCAST_SYNTH_CONCURRENCY", "4"))
 
-def _load_audio_workaround(filepath):
+def _render_podcast(parts: list, filepath: str) -> str:
     """
-    Workaround for missing ffprobe: Convert MP3 to WAV using ffmpeg 
-    and load the WAV using pydub.
+    Stream the turns, with natural pauses, into the MP3 encoder. Runs in the render pool.
+    Repeated turns are the same decoded segment, so the episode is never joined in memory.
     """
-    if not os.path.exists(filepath):
-        return None
-        
-    try:
-        # If it's already a wav, load it
-        if filepath.endswith('.wav'):
-            return AudioSegment.from_wav(filepath)
-            
-        # Convert to wav
-        wav_path = filepath.replace('.mp3', '_temp.wav')
-        ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
-        import subprocess
-        subprocess.run([ffmpeg_exe, '-i', filepath, '-y', wav_path], stderr=subprocess.DEVNULL, check=True)
-        
-        audio = AudioSegment.from_wav(wav_path)
-        
-        # Cleanup temp wav
-        if os.path.exists(wav_path):
-            os.remove(wav_path)
-            
-        return audio
-    except Exception as e:
-        print(f"Audio load workaround failed: {e}")
-        return None
+    with Mp3Encoder([{"path": filepath}]) as encoder:
+        for part_audio in parts:
+            encoder.write(part_audio)
+            encoder.write_silence(800) # Natural pause
+    return filepath
 
-async def generate_podcast(topic: str, duration: int = 1, voices: list = None):
+async def generate_podcast(topic: str, duration: int = 1, voices: list = None, progress=None):
     """
     Generate a podcast episode with custom speaker voices.
     voices: list of voice IDs to use for Speaker 1, 2, 3...
+    progress: optional callback(stage, fraction) used by background render jobs.
     """
     # Default voices if none provided
     if not voices:
@@ -125,35 +110,46 @@ async def generate_podcast(topic: str, duration: int = 1, voices: list = None):
         f"Speaker {i+1}": voices[i] for i in range(num_speakers)
     }
     
-    combined_audio = AudioSegment.silent(duration=0)
+    # Timeline of (text, voice) turns; repeated loops and fillers share the same pairs
+    timeline = [(text, speaker_map.get(speaker, voices[0])) for speaker, text in full_script]
+    unique_turns = list(dict.fromkeys(timeline))
+    
+    semaphore = asyncio.Semaphore(max(1, PODCAST_SYNTH_CONCURRENCY))
+    completed = 0
+    
+    async def render_turn(turn):
+        nonlocal completed
+        text, voice = turn
+        async with semaphore:
+            # Stream the turn into memory and decode it without a temp file
+            turn_audio = await tts_service.synthesize_segment(text, voice)
+        completed += 1
+        if progress:
+            progress("synthesizing", 0.8 * completed / len(unique_turns))
+        return turn_audio
     
     try:
-        for speaker, text in full_script:
-            voice = speaker_map.get(speaker, voices[0])
-            filename = f"part_{uuid.uuid4().hex[:8]}.mp3"
-            filepath = os.path.join(OUTPUT_DIR, filename)
-            
-            communicate = edge_tts.Communicate(text, voice)
-            await communicate.save(filepath)
-            
-            if os.path.exists(filepath):
-                part_audio = _load_audio_workaround(filepath)
-                if part_audio:
-                    combined_audio += part_audio + AudioSegment.silent(duration=800) # Natural pause
-                
-                try: os.remove(filepath)
-                except: pass
+        if progress:
+            progress("synthesizing", 0.0)
+        # Render each unique turn once, concurrently, then reuse it across the timeline
+        rendered = await asyncio.gather(*[render_turn(turn) for turn in unique_turns])
+        turn_audio = dict(zip(unique_turns, rendered))
+        
+        parts = [turn_audio[turn] for turn in timeline if turn_audio[turn]]
             
         final_filename = f"podcast_{uuid.uuid4().hex[:8]}.mp3"
-        final_filepath = os.path.join(OUTPUT_DIR, final_filename)
-        combined_audio.export(final_filepath, format="mp3")
+        final_filepath = artifact_store.path_for(final_filename)
+        if progress:
+            progress("mixing", 0.85)
+        await render_pool.run_render(_render_podcast, parts, final_filepath)
+        url = await artifact_store.publish(final_filename, "podcast")
         
         return {
             "status": "success",
             "topic": topic,
             "duration": duration,
             "filename": final_filename,
-            "url": f"/static/audio/{final_filename}",
+            "url": url,
             "num_speakers": num_speakers
         }
     except Exception as e:
@@ -0,0 +1,90 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Number of render processes per web worker (0 runs renders in a thread instead)
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+# Renders allowed to be queued or running at once; further requests wait for a slot
+RENDER_QUEUE_LIMIT = int(os.getenv("RENDER_QUEUE_LIMIT", str(max(1, RENDER_WORKERS) * 4)))
+
+_executor = None
+_slots = None
+_warmups = []  # module-level functions run in every render process as it starts
+
+
+def register_warmup(fn):
+    """
+    Run fn() in each render process when it starts, e.g. to fill a per-process cache
+    before the first render needs it. Register at import time, before the pool starts.
+    """
+    if fn not in _warmups:
+        _warmups.append(fn)
+
+
+def _init_process(warmups):
+    for fn in warmups:
+        try:
+            fn()
+        except Exception as e:
+            print(f"Render process warm-up {fn.__name__} failed: {e}")
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn avoids inheriting the event loop, threads and locks of the web worker
+        _executor = ProcessPoolExecutor(
+            max_workers=RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process,
+            initargs=(tuple(_warmups),)
+        )
+    return _executor
+
+
+def _get_slots():
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(max(1, RENDER_QUEUE_LIMIT))
+    return _slots
+
+
+async def run_render(fn, *args):
+    """
+    Run a CPU-bound render step (mixing, filtering, MP3 export) off the event loop.
+
+    fn must be a module-level function so it can be sent to a worker process.
+    If the awaiting request is cancelled, a render that has not started yet is
+    dropped from the queue.
+    """
+    global _executor
+    async with _get_slots():
+        loop = asyncio.get_running_loop()
+        if RENDER_WORKERS <= 0:
+            return await asyncio.to_thread(fn, *args)
+        try:
+            return await loop.run_in_executor(_get_executor(), fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM kill); start a fresh pool for the next render
+            _executor = None
+            raise
+
+
+async def run_in_thread(fn, *args):
+    """
+    Run a render in a thread, under the same admission limit as run_render. For
+    streaming renders whose heavy lifting happens in ffmpeg processes and whose inputs
+    (open uploads) can't be sent to a worker process.
+    """
+    async with _get_slots():
+        return await asyncio.to_thread(fn, *args)
+
+
+def shutdown():
+    """Stop the render processes, cancelling anything still queued."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
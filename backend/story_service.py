@@ -1,12 +1,7 @@
-import os
-import uuid
-import asyncio
-import edge_tts
+import tts_service
 import random
-from deep_translator import GoogleTranslator
-
-OUTPUT_DIR = "static/audio"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+import translator
+import artifact_store
 
 # Enhanced Story Data with Adjectives, Scene Bridges, and Richer Segments
 STORY_DATA = {
@@ -78,11 +73,14 @@ GENRE_MAP = {
     "moral": "kid_comic"
 }
 
-async def generate_story(genre: str, topic: str = "", age_group: str = "child", language: str = "en", duration: int = 3):
+async def generate_story(genre: str, topic: str = "", age_group: str = "child", language: str = "en", duration: int = 3, progress=None):
     """
     Generate a creative, non-repetitive story with accurate duration scaling.
     duration: target length in minutes.
+    progress: optional callback(stage, fraction) used by background render jobs.
     """
+    if progress:
+        progress("writing", 0.05)
     mapped_genre = GENRE_MAP.get(genre, genre)
     genre_data = STORY_DATA.get(mapped_genre, STORY_DATA["kid_comic"])
     
@@ -153,9 +151,12 @@ async def generate_story(genre: str, topic: str = "", age_group: str = "child",
     # Final Translation
     final_text = story_text
     if language != "en":
+        if progress:
+            progress("translating", 0.15)
         try:
-            translator = GoogleTranslator(source='en', target=language)
-            final_text = translator.translate(story_text)
+            # Translate segment by segment in one batch (off the event loop)
+            translated_segments = await translator.translate_batch(story_segments, language, source='en')
+            final_text = " ".join(translated_segments)
         except Exception as e:
             print(f"Story translation failed: {e}")
             
@@ -164,19 +165,17 @@ async def generate_story(genre: str, topic: str = "", age_group: str = "child",
     voice = LANGUAGE_VOICES.get(language, LANGUAGE_VOICES["en"])["voice"]
     
     # Synthesis
-    filename = f"story_{uuid.uuid4().hex[:8]}.mp3"
-    filepath = os.path.join(OUTPUT_DIR, filename)
-    
+    if progress:
+        progress("synthesizing", 0.3)
     try:
-        communicate = edge_tts.Communicate(final_text, voice)
-        await communicate.save(filepath)
+        filename = await tts_service.synthesize_to_file(final_text, voice, prefix="story")
         
         return {
             "status": "success",
             "title": f"{genre_data['title']} ({language})",
             "story": final_text,
             "filename": filename,
-            "url": f"/static/audio/{filename}",
+            "url": artifact_store.url_for(filename),
             "genre": genre,
             "language": language,
             "topic": topic,
@@ -0,0 +1,183 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import speech_recognition as sr
+from audio_utils import load_audio
+
+# Recognizer calls are blocking HTTP requests; segments of one file run concurrently in this pool
+STT_WORKERS = int(os.getenv("STT_WORKERS", "4"))
+
+# Segmentation (all durations in ms)
+FRAME_MS = 30
+MIN_SILENCE_MS = 500  # pauses shorter than this stay inside a segment
+MIN_SPEECH_MS = 250  # shorter bursts are treated as noise
+PAD_MS = 200  # context kept around each segment so word edges aren't clipped
+MAX_SEGMENT_MS = 30000  # longer speech is split at its quietest frame
+# A frame is speech if it is within this many dB of the loud (90th percentile) frames...
+SPEECH_RANGE_DB = 30.0
+# ...and above this absolute floor (dBFS)
+SILENCE_FLOOR_DB = -50.0
+
+DEFAULT_LANGUAGE = "en-US"
+# Recognizer input format: 16 kHz mono 16-bit PCM (what the Google API resamples to anyway)
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+_executor = ThreadPoolExecutor(max_workers=STT_WORKERS, thread_name_prefix="stt")
+
+
+# ============= Backends =============
+
+class GoogleBackend:
+    """Free Google Web Speech API via speech_recognition."""
+
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def recognize(self, audio_data: sr.AudioData, language: str) -> str:
+        return self.recognizer.recognize_google(audio_data, language=language)
+
+
+# Any object with recognize(audio_data, language) -> str can be installed with set_backend();
+# it should raise sr.UnknownValueError for unintelligible audio and sr.RequestError for service errors.
+_backend = GoogleBackend()
+
+
+def set_backend(backend):
+    """Swap the recognizer (e.g. a local stand-in for tests). Returns the previous backend."""
+    global _backend
+    previous, _backend = _backend, backend
+    return previous
+
+
+# ============= Segmentation =============
+
+def _frames(ms: float) -> int:
+    return max(1, int(round(ms / FRAME_MS))) if ms else 0
+
+
+def frame_energy_db(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+    """RMS level in dBFS of consecutive FRAME_MS frames of mono float samples."""
+    frame = max(1, int(sample_rate * FRAME_MS / 1000))
+    count = len(samples) // frame
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:count * frame].reshape(count, frame).astype(np.float32)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def _runs(mask: np.ndarray) -> list:
+    """[start, end) index pairs of the True runs in a boolean array."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def find_speech_segments(samples: np.ndarray, sample_rate: int) -> list:
+    """
+    Split mono float samples into speech segments on silence.
+    Leading/trailing silence is dropped. Returns (start, end) sample offsets in order.
+    """
+    energy = frame_energy_db(samples, sample_rate)
+    if len(energy) == 0:
+        return []
+
+    threshold = max(SILENCE_FLOOR_DB, np.percentile(energy, 90) - SPEECH_RANGE_DB)
+    voiced = energy > threshold
+
+    # Bridge short pauses so words and phrases stay together
+    min_gap = _frames(MIN_SILENCE_MS)
+    for start, end in _runs(~voiced):
+        if 0 < start and end < len(voiced) and end - start < min_gap:
+            voiced[start:end] = True
+
+    pad = _frames(PAD_MS)
+    max_len = _frames(MAX_SEGMENT_MS)
+    frame = len(samples) // len(energy)
+    segments = []
+    for start, end in _runs(voiced):
+        if end - start < _frames(MIN_SPEECH_MS):
+            continue
+        start, end = max(0, start - pad), min(len(energy), end + pad)
+        # Split overlong speech at the quietest frame of the second half of each window
+        while end - start > max_len:
+            window = energy[start + max_len // 2:start + max_len]
+            cut = start + max_len // 2 + int(np.argmin(window))
+            segments.append((start, cut))
+            start = cut
+        segments.append((start, end))
+
+    return [(start * frame, min(len(samples), end * frame)) for start, end in segments]
+
+
+# ============= Recognition =============
+
+def _recognize(audio_data: sr.AudioData, language: str):
+    """Returns (text, error); an unintelligible segment is ("", None)."""
+    for attempt in range(2):
+        try:
+            return _backend.recognize(audio_data, language), None
+        except sr.UnknownValueError:
+            return "", None
+        except sr.RequestError as e:
+            # One retry for transient network/service errors
+            if attempt:
+                return None, e
+        except Exception as e:
+            return None, e
+
+
+async def transcribe_pcm(pcm: bytes, sample_rate: int, language: str = None) -> str:
+    """
+    Transcribe mono 16-bit PCM: split it on silence, recognize the segments concurrently
+    in the STT pool and join the transcripts in order. Failed segments are skipped;
+    sr.UnknownValueError / sr.RequestError are raised only if nothing was recognized.
+    """
+    language = language or DEFAULT_LANGUAGE
+    samples = np.frombuffer(pcm[:len(pcm) - len(pcm) % SAMPLE_WIDTH], dtype=np.int16)
+    segments = await asyncio.to_thread(find_speech_segments, samples / 32768.0, sample_rate)
+    if not segments:
+        raise sr.UnknownValueError("No speech detected")
+
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*[
+        loop.run_in_executor(
+            _executor, _recognize,
+            sr.AudioData(pcm[start * SAMPLE_WIDTH:end * SAMPLE_WIDTH], sample_rate, SAMPLE_WIDTH),
+            language
+        )
+        for start, end in segments
+    ])
+
+    texts = [text.strip() for text, _ in results if text and text.strip()]
+    errors = [error for _, error in results if error is not None]
+    if errors:
+        print(f"Speech recognition failed for {len(errors)} of {len(results)} segments: {errors[0]}")
+    if texts:
+        return " ".join(texts)
+    if errors:
+        raise errors[0] if isinstance(errors[0], sr.RequestError) else sr.RequestError(str(errors[0]))
+    raise sr.UnknownValueError("Could not understand the audio")
+
+
+def decode_speech(source):
+    """
+    Decode a path or open upload once, straight to recognizer format. The result is
+    5-10x smaller than a 44.1/48 kHz stereo decode. Returns None on failure.
+    """
+    return load_audio(source, frame_rate=SAMPLE_RATE, channels=1)
+
+
+def _to_mono16(audio):
+    return audio.set_channels(1).set_sample_width(SAMPLE_WIDTH)
+
+
+async def transcribe(audio, language: str = None) -> str:
+    """
+    Transcribe a decoded AudioSegment. Pass the output of decode_speech(); any other
+    layout is converted to mono 16-bit first.
+    """
+    if audio.channels != 1 or audio.sample_width != SAMPLE_WIDTH:
+        audio = await asyncio.to_thread(_to_mono16, audio)
+    return await transcribe_pcm(audio.raw_data, audio.frame_rate, language)
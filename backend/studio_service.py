@@ -1,7 +1,14 @@
 import os
+import json
 import uuid
+import asyncio
 from pydub import AudioSegment
 import numpy as np
+from audio_utils import load_audio, to_array, Mp3Encoder, PcmDecoder, AudioDecodeError, TARGET_FRAME_RATE, TARGET_CHANNELS
+import dsp
+import filter_graph
+import render_pool
+import artifact_store
 
 # Configure pydub to use imageio-ffmpeg bundled binary
 try:
@@ -13,125 +20,236 @@ try:
 except ImportError:
     pass
 
-OUTPUT_DIR = "static/audio"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Frames mixed (mashups) and handed to the encoder at a time
+RENDER_BLOCK_FRAMES = 44100
+# "auto" renders a request as one ffmpeg filtergraph when every operation has a native
+# filter (see filter_graph); "python" always decodes and processes the samples here
+STUDIO_RENDER_BACKEND = os.getenv("STUDIO_RENDER_BACKEND", "auto")
 
-def _load_audio_workaround(filepath):
+def _stretch(samples: np.ndarray, sample_rate: int, rate: float) -> np.ndarray:
+    return dsp.time_stretch(samples, rate, sample_rate)
+
+
+def _reverb(samples: np.ndarray, sample_rate: int, wet: float, decay: float, predelay_ms: float) -> np.ndarray:
+    return dsp.reverb(samples, sample_rate, wet=wet, decay=decay, predelay_ms=predelay_ms)
+
+
+def _enhance(samples: np.ndarray, sample_rate: int, headroom_db: float) -> np.ndarray:
+    return dsp.normalize(samples, headroom_db)
+
+
+def _gain(samples: np.ndarray, sample_rate: int, db: float) -> np.ndarray:
+    return dsp.gain(samples, db)
+
+
+def _stutter(samples: np.ndarray, sample_rate: int, slice_ms: float, repeats: int) -> np.ndarray:
+    # Stutter effect: repeat a small segment
+    length = int(sample_rate * slice_ms / 1000.0)
+    return np.concatenate([samples[:length]] * repeats + [samples[length * repeats:]])
+
+
+# Studio effects on float32 (frames, channels) arrays:
+# effect -> (fn(samples, sample_rate, **params), {param: (default, min, max)})
+EFFECTS = {
+    "speed_up": (_stretch, {"rate": (1.5, 1.0, 4.0)}),
+    # Slower tempo at the original pitch
+    "slowed": (_stretch, {"rate": (0.75, 0.25, 1.0)}),
+    "reverb": (_reverb, {"wet": (0.3, 0.0, 1.0), "decay": (1.5, 0.1, 10.0), "predelay_ms": (20.0, 0.0, 500.0)}),
+    "enhance": (_enhance, {"headroom_db": (0.1, 0.0, 20.0)}),
+    "trigger": (_stutter, {"slice_ms": (200.0, 10.0, 2000.0), "repeats": (4, 1, 16)}),
+    "gain": (_gain, {"db": (0.0, -40.0, 20.0)}),
+}
+MAX_EFFECT_CHAIN = 8
+
+
+def _effect_step(item) -> dict:
+    if isinstance(item, str):
+        name, params = item.strip(), {}
+    elif isinstance(item, dict) and isinstance(item.get("name"), str):
+        name = item["name"].strip()
+        # Parameters may be nested under "params" or given next to the name
+        params = item.get("params", {key: value for key, value in item.items() if key != "name"})
+    else:
+        raise ValueError('Each effect must be a name or an object with a "name"')
+    if name not in EFFECTS:
+        raise ValueError(f"Unknown effect: {name}. Available: {', '.join(EFFECTS)}")
+    if not isinstance(params, dict):
+        raise ValueError(f"Parameters of {name} must be an object")
+
+    spec = EFFECTS[name][1]
+    unknown = set(params) - set(spec)
+    if unknown:
+        raise ValueError(f"Unknown parameter(s) for {name}: {', '.join(sorted(unknown))}")
+    resolved = {}
+    for param, (default, low, high) in spec.items():
+        value = params.get(param, default)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{name}.{param} must be a number")
+        if not low <= value <= high:
+            raise ValueError(f"{name}.{param} must be between {low} and {high}")
+        resolved[param] = type(default)(value)
+    return {"name": name, "params": resolved}
+
+
+def parse_effects(value: str) -> list:
     """
-    Workaround for missing ffprobe: Convert MP3 to WAV using ffmpeg 
-    and load the WAV using pydub.
+    Parse an effect chain: a JSON list of names or {"name", "params"} objects, or a
+    comma-separated list of names ("slowed,reverb,enhance"). A single name is a chain
+    of one. Parameters are validated and filled in with defaults. Raises ValueError.
+    """
+    value = (value or "").strip()
+    if value.startswith("["):
+        try:
+            items = json.loads(value)
+        except ValueError:
+            raise ValueError("effects is not valid JSON")
+    else:
+        items = [name for name in value.split(",") if name.strip()]
+    if not items:
+        raise ValueError("At least one effect is required")
+    if len(items) > MAX_EFFECT_CHAIN:
+        raise ValueError(f"At most {MAX_EFFECT_CHAIN} effects can be chained")
+    return [_effect_step(item) for item in items]
+
+
+def _render_effect(audio: AudioSegment, chain: list, filepath: str) -> str:
+    """Apply the effect chain to one decoded buffer and encode it once. Runs in the render pool."""
+    samples = to_array(audio)
+    for step in chain:
+        samples = EFFECTS[step["name"]][0](samples, audio.frame_rate, **step["params"])
+
+    with Mp3Encoder([{"path": filepath}], channels=audio.channels, frame_rate=audio.frame_rate) as encoder:
+        for start in range(0, len(samples), RENDER_BLOCK_FRAMES):
+            encoder.write(samples[start:start + RENDER_BLOCK_FRAMES])
+    return filepath
+
+async def _render_graph(render, *args) -> bool:
+    """
+    Run a filter_graph render (ffmpeg does all the work, so a thread is enough).
+    Returns False if ffmpeg failed, e.g. on an unreadable upload; the caller then takes
+    the Python path, which reports decode errors the usual way.
     """
-    if not os.path.exists(filepath):
-        return None
-        
     try:
-        # If it's already a wav/mp3, try direct load if WAV, else convert
-        if filepath.endswith('.wav'):
-            return AudioSegment.from_wav(filepath)
-            
-        # Convert to wav
-        wav_path = filepath + "_temp.wav"
-        ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
-        import subprocess
-        subprocess.run([ffmpeg_exe, '-i', filepath, '-y', wav_path], stderr=subprocess.DEVNULL, check=True)
-        
-        audio = AudioSegment.from_wav(wav_path)
-        
-        # Cleanup temp wav
-        if os.path.exists(wav_path):
-            os.remove(wav_path)
-            
-        return audio
-    except Exception as e:
-        print(f"Audio load workaround failed: {e}")
-        # Final fallback: try from_file and hope for the best
-        try: return AudioSegment.from_file(filepath)
-        except: return None
-
-async def process_audio(input_path: str, effect: str):
+        await render_pool.run_in_thread(render, *args)
+        return True
+    except AudioDecodeError as e:
+        print(f"Filtergraph render failed, using the Python renderer: {e}")
+        return False
+
+async def process_audio(audio_source, effects):
     """
-    Process an uploaded audio file with various effects.
+    Process an uploaded audio file (path or open upload) with a chain of effects
+    (the output of parse_effects, or an effect chain string).
     """
-    audio = _load_audio_workaround(input_path)
-    if not audio:
-        return {"status": "error", "error": "Could not load background track. Ensure the format is supported."}
-    
-    if effect == "speed_up":
-        audio = audio.speedup(playback_speed=1.5)
-    elif effect == "slowed":
-        # Slowing down requires changing the sample rate or using a stretch algorithm
-        # A simple way in pydub/ffmpeg is to change frame rate
-        audio = audio._spawn(audio.raw_data, overrides={
-            "frame_rate": int(audio.frame_rate * 0.75)
-        }).set_frame_rate(audio.frame_rate)
-    elif effect == "reverb":
-        # Simulate reverb with a delay overlay
-        delay_ms = 100
-        combined = audio.overlay(audio - 10, position=delay_ms)
-        combined = combined.overlay(audio - 20, position=delay_ms * 2)
-        audio = combined
-    elif effect == "enhance":
-        # Basic normalization and compression feel
-        audio = audio.normalize()
-    elif effect == "trigger":
-        # Stutter effect: repeat a small segment
-        segment = audio[:200]
-        audio = (segment * 4) + audio[800:]
-        
+    chain = parse_effects(effects) if isinstance(effects, str) else effects
     filename = f"studio_{uuid.uuid4().hex[:8]}.mp3"
-    filepath = os.path.join(OUTPUT_DIR, filename)
-    audio.export(filepath, format="mp3")
+    filepath = artifact_store.path_for(filename)
+
+    rendered = False
+    if STUDIO_RENDER_BACKEND == "auto" and filter_graph.supports_effects(chain, audio_source):
+        rendered = await _render_graph(filter_graph.render_effects, audio_source, chain, filepath)
+    if not rendered:
+        # Decode in a thread (uploads stream into ffmpeg), render in the pool
+        audio = await asyncio.to_thread(load_audio, audio_source)
+        if not audio:
+            return {"status": "error", "error": "Could not load background track. Ensure the format is supported."}
+        await render_pool.run_render(_render_effect, audio, chain, filepath)
+    url = await artifact_store.publish(filename, "studio")
     
     return {
         "status": "success",
-        "effect": effect,
+        "effect": "+".join(step["name"] for step in chain),
+        "effects": chain,
         "filename": filename,
-        "url": f"/static/audio/{filename}"
+        "url": url
     }
 
-async def create_mashup(audio_path1: str, audio_path2: str, crossfade_style: str = "smooth", balance: float = 0.5):
-    """
-    Generate a mashup of two songs by overlaying them.
-    crossfade_style: smooth, instant, overlap
-    balance: 0.0 (all track 1) to 1.0 (all track 2)
-    """
-    audio1 = _load_audio_workaround(audio_path1)
-    audio2 = _load_audio_workaround(audio_path2)
-    
-    if not audio1 or not audio2:
-        return {"status": "error", "error": "Could not load one or both tracks for mashup."}
-    
+def _mashup_config(crossfade_style: str, balance: float):
+    """(gain1, gain2, offset_ms, fade_ms) for a mashup request; shared by both render backends."""
     # Adjust volumes based on balance
     # pydub gain is in dB. 0.5 balance = no change.
     # We'll use a simple linear-to-dB mapping for the sake of the mashup
-    gain1 = (1.0 - balance - 0.5) * 20 # -10dB to +10dB
-    gain2 = (balance - 0.5) * 20
-    
-    audio1 = audio1 + gain1
-    audio2 = audio2 + gain2
-    
-    # Trim to same length
-    min_len = min(len(audio1), len(audio2))
-    audio1 = audio1[:min_len]
-    audio2 = audio2[:min_len]
+    gain1 = 10 ** ((1.0 - balance - 0.5) * 20 / 20.0) # -10dB to +10dB
+    gain2 = 10 ** ((balance - 0.5) * 20 / 20.0)
     
     # Apply "crossfade" (actually just different overlay offsets/fades for mashup feel)
+    offset_ms = fade_ms = 0
     if crossfade_style == "overlap":
         # Start track 2 slightly later (e.g. 500ms)
-        mashup = audio1.overlay(audio2, position=500)
+        offset_ms = 500
     elif crossfade_style == "smooth":
-        # Simple overlay with a slight fade in on both
-        mashup = audio1.overlay(audio2.fade_in(2000))
-    else: # instant
-        mashup = audio1.overlay(audio2)
-    
+        # Simple overlay with a slight fade in on track 2
+        fade_ms = 2000
+    return gain1, gain2, offset_ms, fade_ms
+
+def _render_mashup(source1, source2, gain1: float, gain2: float, offset_ms: float, fade_ms: float, filepath: str) -> str:
+    """
+    Stream both tracks through a block mixer straight into the MP3 encoder: each
+    input is decoded RENDER_BLOCK_FRAMES at a time, so memory doesn't grow with the
+    length of the songs. The mix ends with the shorter track.
+    """
+    frames_per_ms = TARGET_FRAME_RATE / 1000.0
+    offset = int(offset_ms * frames_per_ms)
+    fade = int(fade_ms * frames_per_ms)
+
+    with PcmDecoder(source1) as track1, PcmDecoder(source2) as track2, \
+            Mp3Encoder([{"path": filepath}]) as encoder:
+        # Track 2 is heard `offset` frames late: a delay line holds its pending frames
+        delay = np.zeros((offset, TARGET_CHANNELS), dtype=np.float32)
+        position = 0  # output frames written
+        while True:
+            block1 = track1.read(RENDER_BLOCK_FRAMES)
+            block2 = track2.read(RENDER_BLOCK_FRAMES)
+            if block1 is None or block2 is None:
+                break
+            # Both tracks are read in step, so a short block means that track has ended
+            frames = min(len(block1), len(block2))
+            delayed = np.concatenate([delay, block2[:frames]])
+            delay = delayed[frames:]
+
+            # Each track is clipped after its gain, like pydub's gain, before they are summed
+            block = np.clip(block1[:frames] * gain1, -1.0, 1.0)
+            overlay = np.clip(delayed[:frames] * gain2, -1.0, 1.0)
+            if fade:
+                # Fade-in envelope over the start of track 2 (its own timeline)
+                overlay *= np.clip(np.arange(position - offset, position - offset + frames) / fade, 0.0, 1.0)[:, None]
+            encoder.write(block + overlay)
+            position += frames
+            if frames < RENDER_BLOCK_FRAMES:
+                break
+        # The longer track is still read to its end, so an over-long upload is rejected
+        # (AudioLimitExceeded) as it is by the filtergraph renderer
+        for track in (track1, track2):
+            while track.read_bytes(RENDER_BLOCK_FRAMES):
+                pass
+        if position == 0:
+            raise AudioDecodeError("No audio decoded from one of the tracks.")
+    return filepath
+
+async def create_mashup(audio_source1, audio_source2, crossfade_style: str = "smooth", balance: float = 0.5):
+    """
+    Generate a mashup of two songs by overlaying them.
+    crossfade_style: smooth, instant, overlap
+    balance: 0.0 (all track 1) to 1.0 (all track 2)
+    """
+    config = _mashup_config(crossfade_style, balance)
     filename = f"mashup_{uuid.uuid4().hex[:8]}.mp3"
-    filepath = os.path.join(OUTPUT_DIR, filename)
-    mashup.export(filepath, format="mp3")
+    filepath = artifact_store.path_for(filename)
+    rendered = False
+    if STUDIO_RENDER_BACKEND == "auto" and filter_graph.supports_mashup():
+        rendered = await _render_graph(filter_graph.render_mashup, audio_source1, audio_source2, *config, filepath)
+    if not rendered:
+        try:
+            # Decoding and encoding run in ffmpeg processes; the open uploads stay in this process
+            await render_pool.run_in_thread(_render_mashup, audio_source1, audio_source2, *config, filepath)
+        except AudioDecodeError as e:
+            print(f"Mashup decode failed: {e}")
+            return {"status": "error", "error": "Could not load one or both tracks for mashup."}
+    url = await artifact_store.publish(filename, "mashup")
     
     return {
         "status": "success",
         "filename": filename,
-        "url": f"/static/audio/{filename}",
+        "url": url,
         "config": {"style": crossfade_style, "balance": balance}
     }
@@ -0,0 +1,117 @@
+import numpy as np
+
+# Vectorized counterparts of pydub's generators, filters and fades.
+# Signals are mono float32 arrays in [-1, 1] at SAMPLE_RATE.
+SAMPLE_RATE = 44100
+
+_rng = np.random.default_rng()
+
+
+def sample_count(duration_ms: float, sample_rate: int = SAMPLE_RATE) -> int:
+    return int(sample_rate * (duration_ms / 1000.0))
+
+
+def db_to_gain(db: float) -> float:
+    return 10 ** (db / 20.0)
+
+
+def _cycle_position(freq: float, n: int, sample_rate: int) -> np.ndarray:
+    """Position within the waveform cycle (0..1) for each of n samples."""
+    return (np.arange(n) * (freq / sample_rate)) % 1.0
+
+
+# ============= Oscillators =============
+
+def sine(freq: float, duration_ms: float, volume: float = 0.0, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    n = sample_count(duration_ms, sample_rate)
+    wave = np.sin(2 * np.pi * freq / sample_rate * np.arange(n))
+    return (wave * db_to_gain(volume)).astype(np.float32)
+
+
+def square(freq: float, duration_ms: float, volume: float = 0.0, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    pos = _cycle_position(freq, sample_count(duration_ms, sample_rate), sample_rate)
+    wave = np.where(pos < 0.5, 1.0, -1.0)
+    return (wave * db_to_gain(volume)).astype(np.float32)
+
+
+def sawtooth(freq: float, duration_ms: float, volume: float = 0.0, sample_rate: int = SAMPLE_RATE, duty_cycle: float = 1.0) -> np.ndarray:
+    pos = _cycle_position(freq, sample_count(duration_ms, sample_rate), sample_rate)
+    rising = 2 * pos / duty_cycle - 1.0
+    if duty_cycle < 1.0:
+        falling = 1.0 - 2 * (pos - duty_cycle) / (1.0 - duty_cycle)
+        wave = np.where(pos < duty_cycle, rising, falling)
+    else:
+        wave = rising
+    return (wave * db_to_gain(volume)).astype(np.float32)
+
+
+def triangle(freq: float, duration_ms: float, volume: float = 0.0, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    return sawtooth(freq, duration_ms, volume, sample_rate, duty_cycle=0.5)
+
+
+def white_noise(duration_ms: float, volume: float = 0.0, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    n = sample_count(duration_ms, sample_rate)
+    return (_rng.uniform(-1.0, 1.0, n) * db_to_gain(volume)).astype(np.float32)
+
+
+# ============= Envelopes =============
+
+def fade_in(signal: np.ndarray, duration_ms: float, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    n = min(sample_count(duration_ms, sample_rate), len(signal))
+    out = signal.copy()
+    out[:n] *= np.linspace(0.0, 1.0, n, endpoint=False, dtype=np.float32)
+    return out
+
+
+def fade_out(signal: np.ndarray, duration_ms: float, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    n = min(sample_count(duration_ms, sample_rate), len(signal))
+    out = signal.copy()
+    if n:
+        out[-n:] *= np.linspace(1.0, 0.0, n, endpoint=False, dtype=np.float32)
+    return out
+
+
+# ============= Filters =============
+
+def _one_pole(signal: np.ndarray, pole: float, transfer) -> np.ndarray:
+    """
+    Apply a one-pole IIR filter in the frequency domain. The signal is zero-padded
+    until the impulse response has decayed, so this matches running the recursion.
+    """
+    n = len(signal)
+    if n == 0:
+        return signal
+    tail = int(np.ceil(np.log(1e-6) / np.log(pole))) if 0 < pole < 1 else n
+    n_fft = 1 << int(np.ceil(np.log2(n + tail)))
+    z1 = np.exp(-2j * np.pi * np.arange(n_fft // 2 + 1) / n_fft)
+    spectrum = np.fft.rfft(signal, n_fft) * transfer(z1)
+    return np.fft.irfft(spectrum, n_fft)[:n].astype(np.float32)
+
+
+def low_pass(signal: np.ndarray, cutoff: float, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """RC low-pass (-6 dB/octave above cutoff), same response as pydub's low_pass_filter."""
+    rc = 1.0 / (cutoff * 2 * np.pi)
+    dt = 1.0 / sample_rate
+    alpha = dt / (rc + dt)
+    return _one_pole(signal, 1.0 - alpha, lambda z1: alpha / (1.0 - (1.0 - alpha) * z1))
+
+
+def high_pass(signal: np.ndarray, cutoff: float, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """RC high-pass (-6 dB/octave below cutoff), same response as pydub's high_pass_filter."""
+    rc = 1.0 / (cutoff * 2 * np.pi)
+    dt = 1.0 / sample_rate
+    alpha = rc / (rc + dt)
+    return _one_pole(signal, alpha, lambda z1: alpha * (1.0 - z1) / (1.0 - alpha * z1))
+
+
+# ============= Mixing =============
+
+def mix_into(buffer: np.ndarray, signal: np.ndarray, position_ms: float = 0, gain_db: float = 0.0, sample_rate: int = SAMPLE_RATE):
+    """Add signal into buffer at position (in place), truncating at the end like pydub's overlay."""
+    start = sample_count(position_ms, sample_rate)
+    if start >= len(buffer):
+        return buffer
+    end = min(len(buffer), start + len(signal))
+    gain = db_to_gain(gain_db) if gain_db else 1.0
+    buffer[start:end] += signal[:end - start] * gain
+    return buffer
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+import dsp
+
+RATE = 44100
+
+
+def _sine(freq, seconds, channels=2, level=0.5):
+    t = np.arange(int(RATE * seconds)) / RATE
+    wave = (level * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+    return np.repeat(wave[:, None], channels, axis=1)
+
+
+def _dominant_freq(samples):
+    mono = samples.mean(axis=1)
+    spectrum = np.abs(np.fft.rfft(mono * np.hanning(len(mono))))
+    return np.argmax(spectrum) * RATE / len(mono)
+
+
+# ============= Gain =============
+
+def test_gain_and_peak():
+    samples = _sine(440, 0.5, level=0.25)
+    assert dsp.peak_db(samples) == pytest.approx(20 * np.log10(0.25), abs=0.01)
+    assert dsp.peak_db(dsp.gain(samples, 6.0206)) == pytest.approx(20 * np.log10(0.5), abs=0.01)
+    assert dsp.peak_db(np.zeros((10, 2), dtype=np.float32)) == -np.inf
+
+
+def test_normalize_to_headroom():
+    samples = _sine(440, 0.5, level=0.1)
+    assert dsp.peak_db(dsp.normalize(samples, 1.0)) == pytest.approx(-1.0, abs=0.01)
+
+    silence = np.zeros((100, 2), dtype=np.float32)
+    assert np.array_equal(dsp.normalize(silence), silence)
+
+
+# ============= Convolution =============
+
+@pytest.mark.parametrize("frames,taps", [(1000, 1), (5000, 300), (200000, 4000), (3000, 100000)])
+def test_convolve_matches_direct_convolution(frames, taps):
+    rng = np.random.default_rng(frames + taps)
+    samples = rng.standard_normal((frames, 2)).astype(np.float32)
+    impulse = rng.standard_normal((taps, 2)).astype(np.float32) / np.sqrt(taps)
+
+    out = dsp.convolve(samples, impulse)
+    assert out.shape == (frames + taps - 1, 2)
+    for channel in range(2):
+        expected = np.convolve(samples[:, channel].astype(np.float64), impulse[:, channel])
+        assert np.max(np.abs(out[:, channel] - expected)) < 1e-3
+
+
+def test_convolve_mono_impulse_applies_to_every_channel():
+    rng = np.random.default_rng(1)
+    samples = rng.standard_normal((2000, 2)).astype(np.float32)
+    impulse = rng.standard_normal(50).astype(np.float32)
+
+    out = dsp.convolve(samples, impulse)
+    for channel in range(2):
+        assert np.allclose(out[:, channel], np.convolve(samples[:, channel], impulse), atol=1e-3)
+
+
+# ============= Reverb =============
+
+def test_reverb_impulse_is_cached_and_unit_energy():
+    impulse = dsp.reverb_impulse(RATE, 0.5, 2)
+    assert impulse is dsp.reverb_impulse(RATE, 0.5, 2)
+    assert not impulse.flags.writeable
+    assert impulse.shape == (int(RATE * 0.5), 2)
+    assert np.allclose(np.sum(impulse ** 2, axis=0), 1.0, atol=1e-4)
+    # Independent noise per channel for stereo width
+    assert not np.allclose(impulse[:, 0], impulse[:, 1])
+
+
+def test_reverb_keeps_dry_signal_and_adds_tail():
+    samples = _sine(440, 0.5)
+    decay, predelay_ms = 0.8, 20.0
+    out = dsp.reverb(samples, RATE, wet=0.0, decay=decay, predelay_ms=predelay_ms)
+
+    predelay = int(RATE * predelay_ms / 1000)
+    assert len(out) == predelay + len(samples) + int(RATE * decay) - 1
+    assert np.allclose(out[:len(samples)], samples)
+    assert not np.any(out[len(samples):])
+
+    wet = dsp.reverb(samples, RATE, wet=0.5, decay=decay, predelay_ms=predelay_ms)
+    assert np.allclose(wet[:predelay], samples[:predelay] * 0.5)
+    assert np.max(np.abs(wet[len(samples):])) > 0.01
+
+
+# ============= Time stretching =============
+
+@pytest.mark.parametrize("rate", [0.5, 0.8, 1.25, 2.0])
+def test_time_stretch_changes_length_not_pitch(rate):
+    samples = _sine(440, 2.0)
+    out = dsp.time_stretch(samples, rate, RATE)
+
+    assert out.shape == (int(len(samples) / rate), 2)
+    assert _dominant_freq(out) == pytest.approx(440, abs=5)
+    # Steady level: no dropouts or doubled frames in the middle of the output
+    middle = out[len(out) // 4:3 * len(out) // 4, 0]
+    assert np.sqrt(np.mean(middle ** 2)) == pytest.approx(0.5 / np.sqrt(2), rel=0.1)
+
+
+def test_time_stretch_identity_and_empty():
+    samples = _sine(440, 0.1)
+    assert dsp.time_stretch(samples, 1.0, RATE) is samples
+    empty = np.zeros((0, 2), dtype=np.float32)
+    assert len(dsp.time_stretch(empty, 1.5, RATE)) == 0
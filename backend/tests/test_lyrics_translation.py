@@ -0,0 +1,74 @@
+import asyncio
+
+import lyrics_service
+import translator
+
+
+LYRICS = "\n".join([
+    "Intro: la la la",
+    "",
+    "Verse 1:",
+    "The night is young",
+    "The stars are bright",
+    "",
+    "Chorus:",
+    "Sing with me",
+    "All night long",
+    "",
+    "Verse 2:",
+    "The road is long",
+    "",
+    "Chorus:",
+    "Sing with me",
+    "All night long",
+    "",
+    "Final Chorus:",
+    "Sing with me",
+])
+
+
+def _translate(lyrics, calls):
+    async def fake_batch(texts, target, source="auto"):
+        calls.extend(texts)
+        return [f"<{target}>" + t.upper() for t in texts]
+
+    original = translator.translate_batch
+    translator.translate_batch = fake_batch
+    try:
+        return asyncio.run(lyrics_service._translate_lyrics(lyrics, "es"))
+    finally:
+        translator.translate_batch = original
+
+
+def test_sections_keep_their_types_after_translation():
+    text, sections = _translate(LYRICS, [])
+    english = lyrics_service._parse_lyrics_into_sections(LYRICS)
+
+    assert [s["type"] for s in sections] == [s["type"] for s in english]
+    assert [len(s["lines"]) for s in sections] == [len(s["lines"]) for s in english]
+    assert sections[1]["lines"] == ["<es>THE NIGHT IS YOUNG", "THE STARS ARE BRIGHT"]
+
+
+def test_labels_are_translated_and_layout_kept():
+    text, _ = _translate(LYRICS, [])
+    lines = text.split("\n")
+
+    assert len(lines) == len(LYRICS.split("\n"))
+    assert lines[2] == "<es>VERSE 1:"
+    assert lines[1] == ""
+
+
+def test_blocks_translated_whole_and_once():
+    calls = []
+    _translate(LYRICS, calls)
+
+    assert "The night is young\nThe stars are bright" in calls
+    assert calls.count("Sing with me\nAll night long") == 2  # translate_batch dedups repeats
+    assert all(c.strip() for c in calls)
+
+
+def test_lyrics_without_labels():
+    text, sections = _translate("one\ntwo\n\nthree", [])
+
+    assert text == "<es>ONE\nTWO\n\n<es>THREE"
+    assert sections == [{"type": "default", "lines": ["<es>ONE", "TWO", "<es>THREE"]}]
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import random
+import string
+
+import analysis_service
+from analysis_service import MOODS
+
+
+def reference_mood(text: str):
+    """The original per-word scan over every keyword, which the automaton must reproduce."""
+    text = text.translate(str.maketrans('', '', string.punctuation)).lower()
+    words = text.split()
+    neutral = {"neutral": 100.0, "happy": 0.0, "sad": 0.0, "angry": 0.0, "calm": 0.0, "energetic": 0.0}
+    if not words:
+        return neutral
+
+    negations = {"not", "no", "never", "dont", "cannot", "isnt", "arent", "wasnt", "werent"}
+    scores = {mood: 0 for mood in MOODS.keys()}
+    found_any = False
+    negated = False
+    for word in words:
+        if word in negations:
+            negated = True
+            continue
+        match_found = False
+        for mood, keywords in MOODS.items():
+            for k in keywords:
+                if k == word:
+                    match_found = True
+                    if not negated:
+                        scores[mood] += 1
+                        found_any = True
+                    break
+                if len(k) > 4 and k in word and not word.startswith("un") and not word.startswith("in"):
+                    match_found = True
+                    if not negated:
+                        scores[mood] += 1
+                        found_any = True
+                    break
+            if match_found:
+                break
+        negated = False
+
+    if not found_any:
+        return neutral
+    total = sum(scores.values())
+    percentages = {mood: round((count / total) * 100, 1) for mood, count in scores.items()}
+    percentages["neutral"] = 0.0
+    return percentages
+
+
+KEYWORDS = [k for keywords in MOODS.values() for k in keywords]
+FILLER = ["the", "day", "was", "and", "i", "feel", "so", "very", "today", "with", "you", "in", "un", "x"]
+NEGATIONS = sorted(analysis_service.NEGATIONS)
+
+
+def _random_word(rng):
+    roll = rng.random()
+    if roll < 0.35:
+        return rng.choice(KEYWORDS)
+    if roll < 0.55:
+        # Keywords inside longer words, including un-/in- prefixes and overlapping keywords
+        return rng.choice(["", "un", "in", "super", "re"]) + rng.choice(KEYWORDS) + rng.choice(["", "ly", "ness", "s", rng.choice(KEYWORDS)])
+    if roll < 0.65:
+        return rng.choice(NEGATIONS)
+    if roll < 0.75:
+        # Partial keywords and random letters
+        k = rng.choice(KEYWORDS)
+        return k[:rng.randint(1, len(k))] + "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(0, 3)))
+    return rng.choice(FILLER)
+
+
+def _random_text(rng):
+    words = []
+    for _ in range(rng.randint(0, 25)):
+        word = _random_word(rng)
+        if rng.random() < 0.2:
+            word = word.upper() if rng.random() < 0.5 else word.capitalize()
+        if rng.random() < 0.2:
+            word += rng.choice(string.punctuation)
+        words.append(word)
+    return " ".join(words)
+
+
+def test_matches_reference_scorer_on_random_texts():
+    rng = random.Random(20)
+    for _ in range(5000):
+        text = _random_text(rng)
+        assert analysis_service.analyze_text_mood(text) == reference_mood(text), text
+
+
+def test_matches_reference_scorer_on_every_keyword():
+    for k in KEYWORDS:
+        for text in (k, "un" + k, "in" + k, k + k, "not " + k, "not happy " + k, "x" + k + "x"):
+            assert analysis_service.analyze_text_mood(text) == reference_mood(text), text
+
+
+def test_bulk_scores_match_reference_scorer():
+    rng = random.Random(7)
+    texts = [_random_text(rng) for _ in range(500)]
+    body = "\n".join(json.dumps({"id": i, "text": t}) for i, t in enumerate(texts)).encode()
+
+    async def chunks():
+        for start in range(0, len(body), 4096):
+            yield body[start:start + 4096]
+
+    async def collect():
+        return [r async for r in analysis_service.analyze_text_mood_bulk(chunks(), "ndjson")]
+
+    results = asyncio.run(collect())
+    summary = results.pop()
+    assert summary["count"] == len(texts)
+    for result in results:
+        assert result["mood"] == reference_mood(texts[result["id"]])
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+import speech_recognition as sr
+
+import stt
+
+RATE = stt.SAMPLE_RATE
+
+
+def _tone(seconds, level=0.5, freq=440.0):
+    t = np.arange(int(RATE * seconds)) / RATE
+    return (level * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def _silence(seconds):
+    return np.zeros(int(RATE * seconds), dtype=np.float32)
+
+
+def _pcm(samples):
+    return (samples * 32767).astype(np.int16).tobytes()
+
+
+def _seconds(segment):
+    start, end = segment
+    return (end - start) / RATE
+
+
+class StubBackend:
+    """Transcribes each segment as its length in whole seconds; fails as scripted."""
+
+    def __init__(self, failures=None):
+        self.failures = failures or {}  # length in seconds -> exceptions raised on successive calls
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def recognize(self, audio_data, language):
+        seconds = round(len(audio_data.frame_data) / stt.SAMPLE_WIDTH / audio_data.sample_rate)
+        with self._lock:
+            self.calls.append(seconds)
+            failures = self.failures.get(seconds)
+            error = failures.pop(0) if failures else None
+        if error is not None:
+            raise error
+        return f"word{seconds}"
+
+
+@pytest.fixture
+def backend():
+    stub = StubBackend()
+    previous = stt.set_backend(stub)
+    yield stub
+    stt.set_backend(previous)
+
+
+# ============= Segmentation =============
+
+def test_splits_on_silence_and_drops_edges():
+    samples = np.concatenate([_silence(1), _tone(1), _silence(1), _tone(2), _silence(1)])
+    segments = stt.find_speech_segments(samples, RATE)
+
+    assert len(segments) == 2
+    pad = stt.PAD_MS / 1000.0
+    assert _seconds(segments[0]) == pytest.approx(1 + 2 * pad, abs=0.05)
+    assert _seconds(segments[1]) == pytest.approx(2 + 2 * pad, abs=0.05)
+    assert segments[0][0] == pytest.approx(RATE * (1 - pad), abs=RATE * 0.05)
+
+
+def test_short_pauses_are_bridged():
+    samples = np.concatenate([_silence(0.5), _tone(1), _silence(0.3), _tone(1), _silence(0.5)])
+    assert len(stt.find_speech_segments(samples, RATE)) == 1
+
+
+def test_short_bursts_are_dropped():
+    samples = np.concatenate([_silence(1), _tone(0.1), _silence(1), _tone(1), _silence(1)])
+    segments = stt.find_speech_segments(samples, RATE)
+
+    assert len(segments) == 1
+    assert _seconds(segments[0]) == pytest.approx(1.4, abs=0.05)
+
+
+def test_silence_has_no_segments():
+    assert stt.find_speech_segments(_silence(2), RATE) == []
+    assert stt.find_speech_segments(np.zeros(0, dtype=np.float32), RATE) == []
+
+
+def test_long_speech_is_cut_at_the_quietest_frame():
+    # 40 s of speech with a quieter (but still voiced) stretch around 22 s
+    samples = _tone(40)
+    samples[int(RATE * 22):int(RATE * 22.2)] *= 0.1
+    segments = stt.find_speech_segments(samples, RATE)
+
+    assert len(segments) == 2
+    assert segments[0][1] == segments[1][0]
+    assert segments[0][1] / RATE == pytest.approx(22.1, abs=0.15)
+    assert all(_seconds(s) * 1000 <= stt.MAX_SEGMENT_MS for s in segments)
+
+
+# ============= Recognition =============
+
+def _speech(*lengths):
+    parts = [_silence(1)]
+    for seconds in lengths:
+        parts += [_tone(seconds - 2 * stt.PAD_MS / 1000.0), _silence(1)]
+    return _pcm(np.concatenate(parts))
+
+
+def test_transcripts_are_joined_in_order(backend):
+    text = asyncio.run(stt.transcribe_pcm(_speech(3, 1, 2), RATE))
+
+    assert text == "word3 word1 word2"
+    assert sorted(backend.calls) == [1, 2, 3]
+
+
+def test_request_errors_are_retried_once(backend):
+    backend.failures = {2: [sr.RequestError("flaky")]}
+    text = asyncio.run(stt.transcribe_pcm(_speech(1, 2), RATE))
+
+    assert text == "word1 word2"
+    assert backend.calls.count(2) == 2
+
+
+def test_segment_failing_twice_is_skipped(backend):
+    backend.failures = {2: [sr.RequestError("down"), sr.RequestError("down")]}
+    text = asyncio.run(stt.transcribe_pcm(_speech(1, 2, 3), RATE))
+
+    assert text == "word1 word3"
+    assert backend.calls.count(2) == 2
+
+
+def test_unintelligible_segments_are_not_retried(backend):
+    backend.failures = {1: [sr.UnknownValueError()]}
+    text = asyncio.run(stt.transcribe_pcm(_speech(1, 2), RATE))
+
+    assert text == "word2"
+    assert backend.calls.count(1) == 1
+
+
+def test_error_raised_when_nothing_is_recognized(backend):
+    backend.failures = {1: [sr.RequestError("down")] * 2}
+    with pytest.raises(sr.RequestError):
+        asyncio.run(stt.transcribe_pcm(_speech(1), RATE))
+
+    backend.failures = {1: [sr.UnknownValueError()]}
+    with pytest.raises(sr.UnknownValueError):
+        asyncio.run(stt.transcribe_pcm(_speech(1), RATE))
+
+    with pytest.raises(sr.UnknownValueError):
+        asyncio.run(stt.transcribe_pcm(_pcm(_silence(2)), RATE))
@@ -1,11 +1,12 @@
 import os
-import uuid
 import asyncio
 import speech_recognition as sr
-from deep_translator import GoogleTranslator
-import edge_tts
+import translator
+import tts_service
 import imageio_ffmpeg
 from pydub import AudioSegment
+import artifact_store
+import stt
 
 # Configure pydub to use bundled FFmpeg
 ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
@@ -13,8 +14,9 @@ AudioSegment.converter = ffmpeg_exe
 # Also set ffprobe path explicitly for better Windows compatibility
 os.environ["PATH"] += os.pathsep + os.path.dirname(ffmpeg_exe)
 
-OUTPUT_DIR = "static/audio"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# /translate-to-all: translations and speech syntheses allowed in flight at once
+TRANSLATE_ALL_TRANSLATE_CONCURRENCY = int(os.getenv("TRANSLATE_ALL_TRANSLATE_CONCURRENCY", "8"))
+TRANSLATE_ALL_TTS_CONCURRENCY = int(os.getenv("TRANSLATE_ALL_TTS_CONCURRENCY", "4"))
 
 LANGUAGE_VOICES = {
     "en": {"voice": "en-US-JennyNeural", "name": "English", "flag": "🇺🇸"},
@@ -44,47 +46,27 @@ def get_supported_languages():
     ]
 
 
-def _convert_to_wav(input_path: str) -> str:
-    """Convert any audio format to WAV using pydub with bundled FFmpeg."""
-    try:
-        wav_path = input_path.rsplit('.', 1)[0] + '_converted.wav'
-
-        # Try to detect format from extension, default to auto-detect
-        try:
-            audio = AudioSegment.from_file(input_path)
-        except Exception:
-            # Fallback for webm or other formats if basic detection fails
-            audio = AudioSegment.from_file(input_path, format="webm")
-
-        # Export as WAV (PCM format that speech_recognition can read)
-        audio.export(wav_path, format="wav")
-        return wav_path
-    except Exception as e:
-        print(f"Audio conversion failed: {e}")
-        return input_path
-
-
-async def translate_audio(audio_file_path: str, target_lang: str, source_lang: str = "auto"):
+async def translate_audio(audio_source, target_lang: str, source_lang: str = "auto"):
     """
     Full translation pipeline:
-    1. Convert audio to WAV using bundled FFmpeg
-    2. Speech-to-Text (recognize audio)
+    1. Decode audio using bundled FFmpeg
+    2. Speech-to-Text (silence-segmented, segments recognized concurrently)
     3. Translate text
     4. Synthesize translated text in target language voice
     """
-    # Step 0: Convert to WAV for compatibility
-    wav_path = _convert_to_wav(audio_file_path)
+    # Step 0: Decode straight to 16 kHz mono PCM in memory (off the event loop)
+    audio = await asyncio.to_thread(stt.decode_speech, audio_source)
+    if audio is None:
+        return {
+            "status": "error",
+            "error": "Could not decode the audio file. Please ensure it is a valid audio format."
+        }
 
     # Step 1: Speech Recognition
-    recognizer = sr.Recognizer()
-    recognizer.energy_threshold = 300
-
     try:
-        with sr.AudioFile(wav_path) as source:
-            audio_data = recognizer.record(source)
-            # Use specific language code for recognition if provided and not 'auto'
-            language_code = source_lang if source_lang != "auto" else None
-            original_text = recognizer.recognize_google(audio_data, language=language_code)
+        # Use specific language code for recognition if provided and not 'auto' (stt defaults to en-US)
+        language_code = source_lang if source_lang != "auto" else None
+        original_text = await stt.transcribe(audio, language_code)
     except sr.UnknownValueError:
         return {
             "status": "error",
@@ -100,21 +82,13 @@ async def translate_audio(audio_file_path: str, target_lang: str, source_lang: s
             "status": "error",
             "error": f"Audio processing error: {str(e)}"
         }
-    finally:
-        # Cleanup converted file
-        if wav_path != audio_file_path and os.path.exists(wav_path):
-            try:
-                os.remove(wav_path)
-            except:
-                pass
 
     # Step 2: Translate
     try:
         if target_lang == "en" and source_lang == "en":
             translated_text = original_text
         else:
-            translator = GoogleTranslator(source=source_lang, target=target_lang)
-            translated_text = translator.translate(original_text)
+            translated_text = await translator.translate(original_text, target_lang, source_lang)
     except Exception as e:
         return {
             "status": "error",
@@ -125,12 +99,8 @@ async def translate_audio(audio_file_path: str, target_lang: str, source_lang: s
     lang_info = LANGUAGE_VOICES.get(target_lang, LANGUAGE_VOICES["en"])
     voice = lang_info["voice"]
 
-    filename = f"translated_{uuid.uuid4().hex[:8]}.mp3"
-    filepath = os.path.join(OUTPUT_DIR, filename)
-
     try:
-        communicate = edge_tts.Communicate(translated_text, voice)
-        await communicate.save(filepath)
+        filename = await tts_service.synthesize_to_file(translated_text, voice, prefix="translated")
     except Exception as e:
         return {
             "status": "error",
@@ -143,7 +113,7 @@ async def translate_audio(audio_file_path: str, target_lang: str, source_lang: s
         "translated_text": translated_text,
         "target_language": lang_info["name"],
         "filename": filename,
-        "url": f"/static/audio/{filename}"
+        "url": artifact_store.url_for(filename)
     }
 
 
@@ -158,8 +128,7 @@ async def translate_text_input(text: str, target_lang: str, source_lang: str = "
 
     # Step 1: Translate
     try:
-        translator = GoogleTranslator(source=source_lang, target=target_lang)
-        translated_text = translator.translate(text)
+        translated_text = await translator.translate(text, target_lang, source_lang)
     except Exception as e:
         return {
             "status": "error",
@@ -170,12 +139,8 @@ async def translate_text_input(text: str, target_lang: str, source_lang: str = "
     lang_info = LANGUAGE_VOICES.get(target_lang, LANGUAGE_VOICES["en"])
     voice = lang_info["voice"]
 
-    filename = f"translated_{uuid.uuid4().hex[:8]}.mp3"
-    filepath = os.path.join(OUTPUT_DIR, filename)
-
     try:
-        communicate = edge_tts.Communicate(translated_text, voice)
-        await communicate.save(filepath)
+        filename = await tts_service.synthesize_to_file(translated_text, voice, prefix="translated")
     except Exception as e:
         return {
             "status": "error",
@@ -188,42 +153,67 @@ async def translate_text_input(text: str, target_lang: str, source_lang: str = "
         "translated_text": translated_text,
         "target_language": lang_info["name"],
         "filename": filename,
-        "url": f"/static/audio/{filename}"
+        "url": artifact_store.url_for(filename)
     }
 
 
-async def translate_to_all_languages(text: str, source_lang: str = "auto"):
+async def stream_translate_to_all(text: str, source_lang: str = "auto"):
     """
-    Simultaneously translate and synthesize voice for all supported languages.
+    Translate and voice the text in every supported language, yielding each
+    language's result as soon as it is ready (completion order, not table order).
+
+    All translations are dispatched up front as one batch; each language's speech
+    synthesis starts as soon as its own translation arrives. The two stages have
+    separate concurrency limits.
     """
-    results = []
-    
+    translate_slots = asyncio.Semaphore(max(1, TRANSLATE_ALL_TRANSLATE_CONCURRENCY))
+    tts_slots = asyncio.Semaphore(max(1, TRANSLATE_ALL_TTS_CONCURRENCY))
+
     async def translate_one(lang_code):
+        async with translate_slots:
+            return await translator.translate(text, lang_code, source_lang)
+
+    translations = {lang_code: asyncio.ensure_future(translate_one(lang_code)) for lang_code in LANGUAGE_VOICES}
+
+    async def voice_one(lang_code):
         try:
-            translator = GoogleTranslator(source=source_lang, target=lang_code)
-            translated_text = translator.translate(text)
+            translated_text = await translations[lang_code]
             
             lang_info = LANGUAGE_VOICES[lang_code]
             voice = lang_info["voice"]
             
-            filename = f"trans_all_{lang_code}_{uuid.uuid4().hex[:4]}.mp3"
-            filepath = os.path.join(OUTPUT_DIR, filename)
-            
-            communicate = edge_tts.Communicate(translated_text, voice)
-            await communicate.save(filepath)
+            async with tts_slots:
+                filename = await tts_service.synthesize_to_file(translated_text, voice, prefix=f"trans_all_{lang_code}")
             
             return {
                 "language": lang_info["name"],
                 "code": lang_code,
                 "translated_text": translated_text,
-                "url": f"/static/audio/{filename}"
+                "url": artifact_store.url_for(filename)
             }
         except Exception as e:
-            return {"language": lang_code, "status": "error", "error": str(e)}
+            return {"language": lang_code, "code": lang_code, "status": "error", "error": str(e)}
 
-    # Run all translations in parallel
-    tasks = [translate_one(lang_code) for lang_code in LANGUAGE_VOICES.keys()]
-    results = await asyncio.gather(*tasks)
+    pending = [asyncio.ensure_future(voice_one(lang_code)) for lang_code in LANGUAGE_VOICES]
+    try:
+        for next_done in asyncio.as_completed(pending):
+            yield await next_done
+    finally:
+        # Client went away: stop the remaining work
+        for task in pending + list(translations.values()):
+            task.cancel()
+
+
+async def translate_to_all_languages(text: str, source_lang: str = "auto"):
+    """
+    Simultaneously translate and synthesize voice for all supported languages.
+    """
+    by_code = {}
+    async for result in stream_translate_to_all(text, source_lang):
+        by_code[result["code"]] = result
+    
+    # Keep the supported-language order in the combined response
+    results = [by_code[lang_code] for lang_code in LANGUAGE_VOICES if lang_code in by_code]
     
     return {
         "status": "success",
@@ -0,0 +1,82 @@
+import os
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from deep_translator import GoogleTranslator
+
+# GoogleTranslator is a blocking HTTP client, so every call runs in this bounded pool
+MAX_WORKERS = int(os.getenv("TRANSLATE_WORKERS", "8"))
+MEMO_SIZE = int(os.getenv("TRANSLATE_CACHE_SIZE", "4096"))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="translate")
+_lock = threading.Lock()
+_memo = OrderedDict()  # (source, target, text) -> translation, least recently used first
+_inflight = {}  # (source, target, text) -> asyncio.Future shared by concurrent callers
+
+
+def _provider_lang(code: str) -> str:
+    # Map 'zh' to 'zh-CN' for deep-translator compatibility
+    return "zh-CN" if code == "zh" else code
+
+
+def _translate_sync(source: str, target: str, text: str) -> str:
+    return GoogleTranslator(source=_provider_lang(source), target=_provider_lang(target)).translate(text)
+
+
+def _lookup(key):
+    with _lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+    return None
+
+
+def _store(key, value):
+    with _lock:
+        _memo[key] = value
+        _memo.move_to_end(key)
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+
+
+async def translate(text: str, target: str, source: str = "auto") -> str:
+    """
+    Translate text without blocking the event loop.
+    Results are memoized; identical requests already in flight share one provider call.
+    """
+    if not text or not text.strip() or source == target:
+        return text
+
+    key = (source, target, text)
+    cached = _lookup(key)
+    if cached is not None:
+        return cached
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, _translate_sync, source, target, text)
+    _inflight[key] = future
+    try:
+        result = await asyncio.shield(future)
+    finally:
+        _inflight.pop(key, None)
+
+    if result is not None:
+        _store(key, result)
+    return result
+
+
+async def translate_batch(texts: list, target: str, source: str = "auto") -> list:
+    """
+    Translate many strings to one target language, preserving order.
+    Duplicates are translated once and cache misses run concurrently in the pool.
+    """
+    unique = list(dict.fromkeys(texts))
+    translated = await asyncio.gather(*[translate(t, target, source) for t in unique])
+    lookup = dict(zip(unique, translated))
+    return [lookup[t] for t in texts]
+
@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Encoded audio is stored outside static/ so cache entries are never served directly
+CACHE_DIR = os.getenv("TTS_CACHE_DIR", "cache/tts")
+MAX_DISK_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+MAX_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+# Eviction trims the disk store to this fraction of its budget, so a full store isn't rescanned on every put
+DISK_LOW_WATER = 0.9
+# Memory hits refresh the disk entry's mtime at most this often, so disk eviction stays LRU
+DISK_TOUCH_SECONDS = int(os.getenv("TTS_CACHE_TOUCH_SECONDS", "60"))
+
+# edge-tts default output; part of the key so a format change never serves stale audio
+OUTPUT_FORMAT = "audio-24khz-48kbitrate-mono-mp3"
+
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+_lock = threading.Lock()
+_evict_lock = threading.Lock()  # one eviction scan at a time, run without holding _lock
+_memory = OrderedDict()  # key -> bytes, least recently used first
+_memory_bytes = 0
+_touched = {}  # key -> when its disk entry was last touched, for keys in the memory tier
+_disk_bytes = None  # computed lazily from a directory scan
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "memory_evictions": 0, "disk_evictions": 0}
+
+
+def cache_key(text: str, voice: str, rate: str = "+0%", pitch: str = "+0Hz", output_format: str = OUTPUT_FORMAT) -> str:
+    """Content address for a synthesis request."""
+    payload = json.dumps([text, voice, rate, pitch, output_format], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _disk_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.mp3")
+
+
+def _remember(key: str, data: bytes):
+    """Insert into the in-memory hot tier, evicting least recently used entries. Caller holds the lock."""
+    global _memory_bytes
+    if len(data) > MAX_MEMORY_BYTES:
+        return
+    if key in _memory:
+        _memory.move_to_end(key)
+        return
+    _memory[key] = data
+    _memory_bytes += len(data)
+    while _memory_bytes > MAX_MEMORY_BYTES:
+        evicted_key, evicted = _memory.popitem(last=False)
+        _touched.pop(evicted_key, None)
+        _memory_bytes -= len(evicted)
+        _stats["memory_evictions"] += 1
+
+
+def _scan_disk():
+    """Return (mtime, size, path) for every entry in the disk store."""
+    entries = []
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    return entries
+
+
+def _evict_disk():
+    """
+    Recount the disk store and, if it is over budget, trim it to the low-water mark,
+    oldest access first. Called without _lock held; concurrent callers skip the scan.
+    """
+    global _disk_bytes
+    if not _evict_lock.acquire(blocking=False):
+        return
+    try:
+        entries = _scan_disk()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        if total > MAX_DISK_BYTES:
+            target = int(MAX_DISK_BYTES * DISK_LOW_WATER)
+            entries.sort()
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    evicted += 1
+                except OSError:
+                    pass
+        with _lock:
+            _disk_bytes = total
+            _stats["disk_evictions"] += evicted
+    finally:
+        _evict_lock.release()
+
+
+def _touch(path: str):
+    """Mark a disk entry as recently used (eviction goes by mtime)."""
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def get(key: str):
+    """Return cached encoded audio for key, or None on a miss."""
+    now = time.monotonic()
+    with _lock:
+        data = _memory.get(key)
+        if data is not None:
+            _memory.move_to_end(key)
+            _stats["memory_hits"] += 1
+            # Hot entries are served from memory, but must not look stale to disk eviction
+            touch = now - _touched.get(key, float("-inf")) >= DISK_TOUCH_SECONDS
+            if touch:
+                _touched[key] = now
+    if data is not None:
+        if touch:
+            _touch(_disk_path(key))
+        return data
+
+    path = _disk_path(key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        _touch(path)
+    except OSError:
+        data = None
+
+    with _lock:
+        if not data:
+            _stats["misses"] += 1
+            return None
+        _stats["disk_hits"] += 1
+        _remember(key, data)
+        if key in _memory:
+            _touched[key] = now
+    return data
+
+
+def put(key: str, data: bytes):
+    """Store encoded audio in both tiers."""
+    global _disk_bytes
+    if not data:
+        return
+
+    path = _disk_path(key)
+    try:
+        # An overwrite replaces the old entry's bytes rather than adding to them
+        previous = os.path.getsize(path)
+    except OSError:
+        previous = 0
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers (other workers too) never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"TTS cache write failed: {e}")
+        path = None
+
+    with _lock:
+        _remember(key, data)
+        if key in _memory:
+            _touched[key] = time.monotonic()
+        if path is None:
+            return
+        # The running size starts from one directory scan
+        scan = _disk_bytes is None
+        if not scan:
+            _disk_bytes += len(data) - previous
+            scan = _disk_bytes > MAX_DISK_BYTES
+    if scan:
+        _evict_disk()
+
+
+def get_stats():
+    """Hit/miss counters and current tier sizes."""
+    with _lock:
+        lookups = _stats["memory_hits"] + _stats["disk_hits"] + _stats["misses"]
+        hits = _stats["memory_hits"] + _stats["disk_hits"]
+        return {
+            **_stats,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(_memory),
+            "memory_bytes": _memory_bytes,
+            "disk_bytes": _disk_bytes,
+            "max_memory_bytes": MAX_MEMORY_BYTES,
+            "max_disk_bytes": MAX_DISK_BYTES,
+        }
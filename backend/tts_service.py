@@ -2,9 +2,9 @@ import edge_tts
 import os
 import uuid
 import asyncio
-
-OUTPUT_DIR = "static/audio"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+from audio_utils import decode_bytes
+import tts_cache
+import artifact_store
 
 async def get_voices():
     # Get standard system voices
@@ -16,17 +16,108 @@ async def get_voices():
         
     return voice_list
 
-async def synthesize_speech(text: str, voice: str):
-    # Use standard edge-tts
-    filename = f"{uuid.uuid4()}.mp3"
-    filepath = os.path.join(OUTPUT_DIR, filename)
+# Size of the slices cached audio is replayed in when streaming
+STREAM_CHUNK_BYTES = 16 * 1024
+
+_inflight = {}  # cache key -> asyncio.Future of the audio, shared by concurrent misses
+
+def speech_filename(text: str, voice: str, prefix: str = "tts", rate: str = "+0%", pitch: str = "+0Hz") -> str:
+    """Content-addressed output filename, so identical requests share one file."""
+    return f"{prefix}_{tts_cache.cache_key(text, voice, rate, pitch)[:16]}.mp3"
+
+def _write_file(filepath: str, data: bytes):
+    # Write then rename so a concurrent reader never serves a partial file
+    tmp_path = f"{filepath}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, filepath)
+
+async def stream_speech(text: str, voice: str, rate: str = "+0%", pitch: str = "+0Hz", save_as: str = None):
+    """
+    Yield encoded MP3 chunks as soon as edge-tts produces them.
+    Cache hits are replayed from memory/disk, and a request for audio that is already
+    being synthesized waits for that synthesis instead of starting another. Once the
+    stream completes, the audio is added to the cache and, if save_as is given,
+    stored as an artifact.
+    """
+    key = tts_cache.cache_key(text, voice, rate, pitch)
+    cached = await asyncio.to_thread(tts_cache.get, key)
+    if not cached and key in _inflight:
+        # Resolves to None if that synthesis failed; then this request tries itself
+        cached = await asyncio.shield(_inflight[key])
+    if cached:
+        for i in range(0, len(cached), STREAM_CHUNK_BYTES):
+            yield cached[i:i + STREAM_CHUNK_BYTES]
+        data = cached
+    else:
+        future = asyncio.get_running_loop().create_future()
+        _inflight[key] = future
+        data = None
+        try:
+            communicate = edge_tts.Communicate(text, voice, rate=rate, pitch=pitch)
+            buffer = bytearray()
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    buffer.extend(chunk["data"])
+                    yield chunk["data"]
+            data = bytes(buffer)
+            await asyncio.to_thread(tts_cache.put, key, data)
+        finally:
+            # Also reached on errors and abandoned streams, so waiters are never left hanging
+            if _inflight.get(key) is future:
+                del _inflight[key]
+            future.set_result(data or None)
     
-    communicate = edge_tts.Communicate(text, voice)
-    await communicate.save(filepath)
+    if save_as and data:
+        filepath = artifact_store.path_for(save_as)
+        if not os.path.exists(filepath):
+            await asyncio.to_thread(_write_file, filepath, data)
+        await artifact_store.publish(save_as, "tts")
+
+async def synthesize_audio(text: str, voice: str, rate: str = "+0%", pitch: str = "+0Hz") -> bytes:
+    """
+    Return the encoded MP3 bytes for a synthesis request.
+    Served from the content-addressed cache when possible; otherwise edge-tts
+    audio chunks are streamed into memory and cached for next time.
+    """
+    chunks = [chunk async for chunk in stream_speech(text, voice, rate=rate, pitch=pitch)]
+    return b"".join(chunks)
+
+async def synthesize_to_file(text: str, voice: str, prefix: str = "tts", rate: str = "+0%", pitch: str = "+0Hz") -> str:
+    """
+    Synthesize into the artifact store and return the filename.
+    Filenames are derived from the cache key, so identical requests share one file.
+    """
+    filename = speech_filename(text, voice, prefix, rate, pitch)
+    filepath = artifact_store.path_for(filename)
+    
+    if not os.path.exists(filepath):
+        data = await synthesize_audio(text, voice, rate=rate, pitch=pitch)
+        if not data:
+            raise RuntimeError("No audio was received from the TTS service.")
+        await asyncio.to_thread(_write_file, filepath, data)
+    
+    # Registering an existing file refreshes its last access
+    await artifact_store.publish(filename, prefix)
+    return filename
+
+async def synthesize_segment(text: str, voice: str, rate: str = "+0%", pitch: str = "+0Hz"):
+    """
+    Synthesize speech and decode it straight to an AudioSegment for mixing.
+    Nothing is written to disk; returns None if the provider sent no audio.
+    """
+    data = await synthesize_audio(text, voice, rate=rate, pitch=pitch)
+    if not data:
+        return None
+    return await asyncio.to_thread(decode_bytes, data)
+
+async def synthesize_speech(text: str, voice: str):
+    # Use standard edge-tts (through the shared audio cache)
+    filename = await synthesize_to_file(text, voice)
     
     return {
         "filename": filename,
-        "url": f"/static/audio/{filename}",
+        "url": artifact_store.url_for(filename),
         "text": text,
         "voice": voice,
         "type": "tts"
@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import gzip
+import asyncio
+import hashlib
+import tts_service
+
+# The provider's voice list changes rarely; serve it from memory and refresh in the background
+VOICES_TTL_SECONDS = int(os.getenv("VOICES_TTL_SECONDS", str(6 * 3600)))
+VOICES_FETCH_TIMEOUT = float(os.getenv("VOICES_FETCH_TIMEOUT", "15"))
+# Shared by every worker on the host, so only one of them has to hit the provider
+CACHE_FILE = os.getenv("VOICES_CACHE_FILE", "cache/voices.json")
+# A refresh lock older than this belongs to a worker that died mid-fetch
+REFRESH_LOCK_SECONDS = 60
+# After a failed refresh the stale list is served this long before trying again
+REFRESH_RETRY_SECONDS = 60
+# Distinct filter combinations kept encoded in memory
+MAX_FILTERED_RESPONSES = 256
+# Filtered responses above this size are gzip-compressed for clients that accept it
+GZIP_MIN_BYTES = 1024
+
+FIELDS = ("ShortName", "FriendlyName", "Gender", "Locale", "SuggestedCodec")
+
+_catalog = None  # see _build()
+_refresh_task = None
+_last_failure = 0.0
+_filtered = {}  # (locale, gender, language) -> encoded response, reset on every refresh
+
+
+def _project(voices: list) -> list:
+    return [{field: v.get(field) for field in FIELDS} for v in voices]
+
+
+def _index(voices: list, key) -> dict:
+    index = {}
+    for i, voice in enumerate(voices):
+        index.setdefault(key(voice), []).append(i)
+    return index
+
+
+def _encode(voices: list) -> dict:
+    body = json.dumps(voices, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return {
+        "body": body,
+        "gzip": gzip.compress(body, 6) if len(body) >= GZIP_MIN_BYTES else None,
+        "etag": '"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+    }
+
+
+def _build(voices: list, fetched_at: float) -> dict:
+    """Precompute the encoded full response and the lookup indexes."""
+    global _filtered
+    _filtered = {}
+    return {
+        "voices": voices,
+        "fetched_at": fetched_at,
+        "full": _encode(voices),
+        "by_locale": _index(voices, lambda v: (v["Locale"] or "").lower()),
+        "by_gender": _index(voices, lambda v: (v["Gender"] or "").lower()),
+        "by_language": _index(voices, lambda v: (v["Locale"] or "").split("-")[0].lower()),
+    }
+
+
+def _is_fresh(catalog) -> bool:
+    return catalog is not None and time.time() - catalog["fetched_at"] < VOICES_TTL_SECONDS
+
+
+# ============= Shared disk copy =============
+
+def _read_disk():
+    try:
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data["voices"], data["fetched_at"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_disk(voices: list, fetched_at: float):
+    try:
+        os.makedirs(os.path.dirname(CACHE_FILE) or ".", exist_ok=True)
+        tmp_path = f"{CACHE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": fetched_at, "voices": voices}, f, ensure_ascii=False)
+        os.replace(tmp_path, CACHE_FILE)
+    except OSError as e:
+        print(f"Voice catalog cache write failed: {e}")
+
+
+def _acquire_refresh_lock() -> bool:
+    lock_path = f"{CACHE_FILE}.lock"
+    try:
+        if time.time() - os.path.getmtime(lock_path) > REFRESH_LOCK_SECONDS:
+            os.remove(lock_path)
+    except OSError:
+        pass
+    try:
+        os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+    except OSError:
+        # Read-only or missing cache directory: refresh without coordination
+        return True
+
+
+def _release_refresh_lock():
+    try:
+        os.remove(f"{CACHE_FILE}.lock")
+    except OSError:
+        pass
+
+
+# ============= Loading =============
+
+async def _refresh():
+    """Load a newer catalog from disk (another worker's fetch) or from the provider."""
+    global _catalog
+    disk = await asyncio.to_thread(_read_disk)
+    if disk and (_catalog is None or disk[1] > _catalog["fetched_at"]):
+        _catalog = _build(*disk)
+        if _is_fresh(_catalog):
+            return
+
+    if not await asyncio.to_thread(_acquire_refresh_lock):
+        # Another worker is fetching; keep serving what we have, or wait for its result
+        deadline = time.time() + VOICES_FETCH_TIMEOUT
+        while _catalog is None and time.time() < deadline:
+            await asyncio.sleep(0.25)
+            disk = await asyncio.to_thread(_read_disk)
+            if disk:
+                _catalog = _build(*disk)
+        if _catalog is None:
+            raise RuntimeError("Timed out waiting for the voice list.")
+        return
+    try:
+        voices = _project(await asyncio.wait_for(tts_service.get_voices(), VOICES_FETCH_TIMEOUT))
+        fetched_at = time.time()
+        _catalog = _build(voices, fetched_at)
+        await asyncio.to_thread(_write_disk, voices, fetched_at)
+    finally:
+        await asyncio.to_thread(_release_refresh_lock)
+
+
+async def _refresh_in_background():
+    global _last_failure
+    try:
+        await _refresh()
+    except Exception as e:
+        _last_failure = time.time()
+        print(f"Voice catalog refresh failed (serving stale list): {e}")
+
+
+async def get_catalog() -> dict:
+    """
+    Current catalog. Fresh data is returned without any I/O; stale data is returned
+    immediately while one background refresh runs (stale-while-revalidate). Only a
+    worker with nothing cached waits for the disk copy or the provider.
+    """
+    global _refresh_task
+    if _is_fresh(_catalog):
+        return _catalog
+
+    if _catalog is None:
+        if _refresh_task is not None and not _refresh_task.done():
+            # Startup warm-up is already loading it
+            await asyncio.shield(_refresh_task)
+        if _catalog is None:
+            await _refresh()
+        return _catalog
+
+    idle = _refresh_task is None or _refresh_task.done()
+    if idle and time.time() - _last_failure > REFRESH_RETRY_SECONDS:
+        _refresh_task = asyncio.create_task(_refresh_in_background())
+    return _catalog
+
+
+def warm():
+    """Start loading the catalog without waiting for it (called from app startup)."""
+    global _refresh_task
+    if _catalog is None and (_refresh_task is None or _refresh_task.done()):
+        _refresh_task = asyncio.create_task(_refresh_in_background())
+
+
+def _split(value):
+    return [part.strip().lower() for part in value.split(",") if part.strip()] if value else []
+
+
+async def get_response(locale: str = None, gender: str = None, language: str = None) -> dict:
+    """
+    Encoded /voices response ({"body", "gzip", "etag"}), optionally filtered.
+    Each filter accepts comma-separated values; filters combine with AND.
+    """
+    catalog = await get_catalog()
+    filters = (tuple(_split(locale)), tuple(_split(gender)), tuple(_split(language)))
+    if not any(filters):
+        return catalog["full"]
+
+    encoded = _filtered.get(filters)
+    if encoded is None:
+        selected = None
+        for values, index in zip(filters, ("by_locale", "by_gender", "by_language")):
+            if not values:
+                continue
+            matches = {i for value in values for i in catalog[index].get(value, ())}
+            selected = matches if selected is None else selected & matches
+        encoded = _encode([catalog["voices"][i] for i in sorted(selected)])
+        if len(_filtered) >= MAX_FILTERED_RESPONSES:
+            _filtered.clear()
+        _filtered[filters] = encoded
+    return encoded
@@ -122,10 +122,15 @@ export const generate_ringtone = async () => {
 };
 
 // ============= Audio Studio & Mashup =============
+// effect: a single effect name, or an ordered chain of names / { name, params } objects
 export const studio_process = async (audioFile, effect) => {
     const formData = new FormData();
     formData.append('audio', audioFile);
-    formData.append('effect', effect);
+    if (Array.isArray(effect)) {
+        formData.append('effects', JSON.stringify(effect));
+    } else {
+        formData.append('effect', effect);
+    }
     const response = await api.post('/studio-process', formData, {
         headers: { 'Content-Type': 'multipart/form-data' },
     });